@@ -1,10 +1,18 @@
-import collections
-from queue import Queue, Empty
+from collections.abc import Iterable
+from concurrent.futures import wait
+from queue import Queue
 import threading
+import time
 
+import sublime
 import sublime_plugin
 
-from DynamicCompletions import CompletionTrigger, CompletionLoader
+from DynamicCompletions import CompletionTrigger, CompletionLoader, ViewData
+from DynamicCompletions.src import event_loop
+from DynamicCompletions.src import executor
+from DynamicCompletions.src import ranking
+from DynamicCompletions.src import stats
+from DynamicCompletions.src.settings import get_setting
 
 try:
     import sublimelogging
@@ -14,154 +22,369 @@ except ImportError:
     logger = logging.getLogger(__name__)
     # logger.setLevel('DEBUG')
 
+
+def plugin_unloaded():
+    """Cancel running loads and shut down the shared executor and event loop."""
+    CompletionLoader.cancel_all_loads()
+    executor.shutdown_executor()
+    event_loop.shutdown_event_loop()
+
+
+class DynamicCompletionsStatsCommand(sublime_plugin.WindowCommand):
+    """Shows the latency of each stage of completion loading."""
+
+    def run(self):
+        view = self.window.new_file()
+        view.set_name('DynamicCompletions Statistics')
+        view.set_scratch(True)
+        view.run_command('append', {'characters': stats.report()})
+        view.set_read_only(True)
+
+
+class DynamicCompletionsResetStatsCommand(sublime_plugin.WindowCommand):
+    """Clears the recorded completion loading latencies."""
+
+    def run(self):
+        stats.reset()
+
+
 class DynamicCompletionsCommand(sublime_plugin.EventListener):
     """General command for loading completions."""
 
+    # IDs of views with a re-query of the auto-complete popup scheduled.
+    PendingRequeries = set()
+
+    # The change count of each view whose popup is being re-queried, by view
+    # ID. Queries caused by a re-query do not schedule another re-query.
+    Requeries = dict()
+
+    # The results of completers that missed the deadline, by view ID. Each
+    # value is a tuple of (change_count, {completer: [results]}). The
+    # re-query uses these instead of calling the completers again.
+    LateResults = dict()
+    LateResultsLock = threading.Lock()
+
     def on_query_completions(self, view, prefix, locations):
         """Returns a list of completions for the word that is being typed."""
+        with stats.timed('on_query_completions'):
+            return self.query_completions(view, prefix, locations)
+
+    def query_completions(self, view, prefix, locations):
+        """Returns a list of completions, timing each stage."""
         logger.debug('DynamicCompletions - getting completion types')
-        completion_types = CompletionTrigger.get_completion_types(view, prefix, locations)
+        with stats.timed('trigger_lookup'):
+            completion_types = CompletionTrigger.get_completion_types(view, prefix, locations)
         logger.debug(completion_types)
 
         if not completion_types:
             return
 
-        CompletionLoader.run_on_before_load_callbacks(view,
-                                                      prefix,
-                                                      locations,
-                                                      completion_types)
-
-        loaders = set()
-        for c in CompletionLoader.get_plugins():
-            # logger.debug('c = %s', c)
-            # logger.debug('c.instances_for_view(view) = %s', c.instances_for_view(view))
-            if c.full_view_check(view):
-                loaders.update(c.instances_for_view(view))
+        with stats.timed('before_callbacks'):
+            CompletionLoader.run_on_before_load_callbacks(view,
+                                                          prefix,
+                                                          locations,
+                                                          completion_types)
 
-        # loaders = CompletionLoader.get_loaders_for_view(view)
+        with stats.timed('loader_selection'):
+            loaders = CompletionLoader.get_active_loaders_for_view(view)
         logger.debug('loaders = %s', loaders)
 
         if not loaders:
             return
 
         completion_queue = Queue()
-        self.add_completions_to_queue(view, completion_queue, completion_types, loaders)
+        with stats.timed('loaders'):
+            self.add_completions_to_queue(view, completion_queue,
+                                          completion_types, loaders, prefix)
 
-        completions = self.get_completions_from_queue(completion_queue)
+        completions = self.get_completions_from_queue(completion_queue, prefix)
         # logger.debug(completions)
 
-        CompletionLoader.run_on_after_load_callbacks(view,
-                                                     prefix,
-                                                     locations,
-                                                     completion_types,
-                                                     completions)
+        with stats.timed('after_callbacks'):
+            CompletionLoader.run_on_after_load_callbacks(view,
+                                                         prefix,
+                                                         locations,
+                                                         completion_types,
+                                                         completions)
 
         return completions
 
-    def add_completions_to_queue(self, view, completion_queue, completion_types, loaders):
+    def on_modified_async(self, view):
+        """Let the loaders know that the view's text has changed."""
+        CompletionLoader.modify_view(view)
+
+    def on_load_async(self, view):
+        """Let the loaders know that the view's file has been loaded."""
+        CompletionLoader.modify_view(view)
+        self.prefetch(view)
+
+    def on_activated_async(self, view):
+        """Prefetch the completions for the view that received focus."""
+        self.prefetch(view)
+
+    @staticmethod
+    def prefetch(view):
+        """Start loading the completions for view if prefetching is enabled."""
+        if get_setting('prefetch_on_activation', False):
+            CompletionLoader.prefetch_view(view)
+
+    def on_close(self, view):
+        """Release the completions held for the closed view."""
+        self.Requeries.pop(view.id(), None)
+        with self.LateResultsLock:
+            self.LateResults.pop(view.id(), None)
+        CompletionLoader.close_view(view)
+
+    def add_completions_to_queue(self, view, completion_queue, completion_types,
+                                 loaders, prefix = None):
         """Adds completions to the completion_queue.
 
         Keyword arguments:
         completion_queue - A Queue for holding the completions returned by the Completers
         completion_types - A set of the types of completions needed
         view - A sublime.View object for the current file
+        prefix - The text that has been typed
+
+        Asynchronous completers are given until the completion_deadline_ms
+        setting expires. Completers that finish after the deadline, or that
+        are still loading their completions in the background, trigger a
+        re-query of the auto-complete popup when they are done. The results
+        of late completers are kept, and the re-query uses them instead of
+        calling the completers again. A query caused by a re-query does not
+        schedule another one.
 
         """
-        # Build a queue of completers that can be run asynchronously (i.e. Not ViewCompleters)
-        async_loaders = Queue()
+        start_time = time.perf_counter()
+        deadline = self.get_deadline()
+        requery = self.is_requery(view)
+        if requery:
+            late_results = self.pop_late_results(view)
+        else:
+            late_results = dict()
+
+        # Split the completers that can be run asynchronously (i.e. Not ViewCompleters)
+        async_loaders = []
         sync_loaders = []
         for l in loaders:
-            if l.LoadAsync:
-                async_loaders.put(l)
+            if l in late_results:
+                # The completer finished after the deadline of the last query
+                for result in late_results[l]:
+                    completion_queue.put(result)
+            elif l.LoadAsync:
+                async_loaders.append(l)
             else:
                 sync_loaders.append(l)
 
-        def process_completers(completers, completion_types, completion_queue):
-            """For each completer, add its completions to the completion_queue.
+        def process_completer(completer, loader_queue):
+            """Add the completions for completer to loader_queue.
 
-            Keyword arguments:
-            completers - A Queue of Completer objects
-            completion_types - A set of the types of completions requested
-            completion_queue - The completions returned by a completer are added to this Queue
-            view - A sublime.View object
-
-            This function is structured so that it can be called from a thread
-            for concurrent processing. It cannot be used to process
-            ViewCompleters due to the fact that commands obtain some type of
-            thread lock on the view.
+            This function is submitted to the shared executor for concurrent
+            processing. It cannot be used to process ViewCompleters due to
+            the fact that commands obtain some type of thread lock on the
+            view.
 
             """
-            logger.debug('process_completers running')
-            proceed = True
-            while proceed:
-                try:
-                    c = completers.get(timeout = 0.1)
-                except Empty:
-                    proceed = False
-                else:
-                    try:
-                        c.get_completions(completion_types=completion_types,
-                                          completion_queue=completion_queue)
-                    except Exception:
-                        logger.exception(
-                            'Unhandled exception in CompletionLoader: %s', c)
-                    finally:
-                        completers.task_done()
-                    # c.get_completions(completion_types=completion_types,
-                    #                       completion_queue=completion_queue)
-                    # completers.task_done()
-
-            logger.debug('process_completers stopping')
+            try:
+                with stats.timed('get_completions',
+                                 completer.__class__.__name__):
+                    completer.get_completions(completion_types=completion_types,
+                                              completion_queue=loader_queue,
+                                              prefix=prefix,
+                                              result_cache=result_cache)
+            except Exception:
+                logger.exception(
+                    'Unhandled exception in CompletionLoader: %s', completer)
 
-            return
+        # The last result of each loader, to narrow as the prefix grows
+        result_cache = ViewData.get_result_cache(view)
 
-        # If there are more than 3 asynchronous completers, run them asynchronously.
-        # Otherwise, run them in the current thread
-        if async_loaders.qsize() > 3:
-            for i in range(2):
-                t = threading.Thread(target = process_completers,
-                                     args = (async_loaders, completion_types,
-                                             completion_queue))
-                t.start()
-        else:
-            process_completers(async_loaders, completion_types,
-                               completion_queue)
+        # Submit the asynchronous completers to the shared executor. Each
+        # has its own queue, so the results of late completers can be kept.
+        futures = dict()
+        for l in async_loaders:
+            loader_queue = Queue()
+            futures[executor.submit(process_completer, l, loader_queue)] = (
+                l, loader_queue)
 
         # Process the synchronous completers in this thread
         for l in sync_loaders:
             try:
-                l.get_completions(completion_types = completion_types,
-                                  completion_queue = completion_queue,
-                                  view = view)
+                with stats.timed('get_completions', l.__class__.__name__):
+                    l.get_completions(completion_types = completion_types,
+                                      completion_queue = completion_queue,
+                                      view = view,
+                                      prefix = prefix,
+                                      result_cache = result_cache)
             except Exception:
                 logger.exception('Unhandled exception in CompletionLoader: %s', l)
 
+        # Wait for the asynchronous completers until the deadline expires
+        if futures:
+            if deadline is None:
+                timeout = None
+            else:
+                timeout = max(0, deadline - (time.perf_counter() - start_time))
+            done, not_done = wait(futures, timeout=timeout)
+            if not_done:
+                logger.debug('%s completers missed the deadline', len(not_done))
+            for f in done:
+                self.drain_queue(futures[f][1], completion_queue)
+        else:
+            not_done = set()
 
-        # Wait for all the asynchronous completers to be processed
-        async_loaders.join()
+        # Keep the results of the late completers for the re-query
+        change_count = view.change_count()
+        for f in not_done:
+            f.add_done_callback(self.late_result_callback(
+                view, change_count, *futures[f]))
+
+        # Re-query the popup when late completers and background loads finish,
+        # unless this query is itself a re-query. Otherwise a loader that
+        # starts a new background load for every query would re-query the
+        # popup forever.
+        if requery:
+            return
+        late = list(not_done)
+        late.extend(l.loader_future for l in loaders
+                    if l.loading and (l.loader_future is not None))
+        if late:
+            requery_callback = self.requery_callback(view)
+            for f in late:
+                f.add_done_callback(requery_callback)
 
-    def get_completions_from_queue(self, completion_queue):
+    @staticmethod
+    def drain_queue(source, destination):
+        """Move every item in the source Queue to the destination Queue."""
+        while not source.empty():
+            destination.put(source.get(block = False))
+
+    @classmethod
+    def late_result_callback(cls, view, change_count, loader, loader_queue):
+        """Return a Future callback that keeps the results of a late completer.
+
+        The results are kept for the view's change count when the query was
+        made, and are dropped if the view has been modified since.
+
+        """
+        view_id = view.id()
+
+        def callback(future):
+            results = []
+            while not loader_queue.empty():
+                results.append(loader_queue.get(block = False))
+            with cls.LateResultsLock:
+                stored = cls.LateResults.get(view_id)
+                if (stored is None) or (stored[0] != change_count):
+                    stored = cls.LateResults[view_id] = (change_count, dict())
+                stored[1][loader] = results
+
+        return callback
+
+    @classmethod
+    def pop_late_results(cls, view):
+        """Return a dict of the late results of each completer for the view.
+
+        Only results for the view's current change count are returned. The
+        results are removed, so they are only used by one query.
+
+        """
+        with cls.LateResultsLock:
+            stored = cls.LateResults.pop(view.id(), None)
+        if (stored is None) or (stored[0] != view.change_count()):
+            return dict()
+        return stored[1]
+
+    @staticmethod
+    def get_deadline():
+        """Return the number of seconds to wait for asynchronous completers.
+
+        None is returned if completions should wait for every completer.
+
+        """
+        deadline = get_setting('completion_deadline_ms', 30)
+        if not deadline or deadline < 0:
+            return None
+        return deadline / 1000.0
+
+    @classmethod
+    def is_requery(cls, view):
+        """Return True if the current query was caused by a re-query.
+
+        The re-query mark is cleared, so it only applies to one query.
+
+        """
+        change_count = cls.Requeries.pop(view.id(), None)
+        return change_count == view.change_count()
+
+    def requery_callback(self, view):
+        """Return a Future callback that re-queries the auto-complete popup.
+
+        The popup is only re-queried if the view has not been modified and
+        the selection has not moved since the callback was created.
+
+        """
+        change_count = view.change_count()
+        selection = [s.b for s in view.sel()]
+
+        def requery():
+            DynamicCompletionsCommand.PendingRequeries.discard(view.id())
+            if not view.is_valid():
+                return
+            if ((view.change_count() != change_count) or
+                    ([s.b for s in view.sel()] != selection)):
+                return
+            logger.debug('Re-querying completions for view %s', view.id())
+            DynamicCompletionsCommand.Requeries[view.id()] = change_count
+            view.run_command('hide_auto_complete')
+            view.run_command('auto_complete', {
+                'disable_auto_insert': True,
+                'next_completion_if_showing': False
+            })
+
+        def callback(future):
+            if view.id() in DynamicCompletionsCommand.PendingRequeries:
+                return
+            DynamicCompletionsCommand.PendingRequeries.add(view.id())
+            sublime.set_timeout(requery, 0)
+
+        return callback
+
+    def get_completions_from_queue(self, completion_queue, prefix = None):
         """Returns a tuple of (completions, flags) based on the contents of the completion_queue.
 
         Keyword arguments:
         completion_queue - A Queue object. The items in the queue should be
         either a collection of completions or a tuple of (completions, flags).
+        A CompletionResult also includes the priority of the loader.
+        prefix - The text that has been typed
+
+        The completions from each loader are merged in sorted order and
+        duplicate triggers are removed. If the max_completions setting is
+        greater than 0, only that many of the best ranked completions are
+        returned, best first.
 
         """
         logger.debug('Getting completions from the queue')
-        completions = []
+        results = []
         flags = 0
-        while not completion_queue.empty():
-            c = completion_queue.get(block = False)
-            if isinstance(c, tuple):
-                try:
-                    flags = flags | c[1]
-                except IndexError:
-                    pass
-                if (isinstance(c[0], collections.Iterable)):
-                    completions.extend(c[0])
-            elif isinstance(c, collections.Iterable):
-                completions.extend(c)
-        completions.sort()
-        return (completions, flags)
+        with stats.timed('queue_draining'):
+            while not completion_queue.empty():
+                c = completion_queue.get(block = False)
+                if ranking.is_flagged_result(c):
+                    try:
+                        flags = flags | c[1]
+                    except IndexError:
+                        pass
+                    if (isinstance(c[0], Iterable)):
+                        results.append((c[0], getattr(c, 'priority', 0)))
+                elif isinstance(c, Iterable):
+                    results.append((c, 0))
 
+        max_completions = get_setting('max_completions', 0)
+        if max_completions and max_completions > 0:
+            with stats.timed('ranking'):
+                completions = ranking.top_k(results, prefix, max_completions)
+        else:
+            with stats.timed('merging'):
+                completions = ranking.merge_results(results)
+        return (completions, flags)
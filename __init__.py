@@ -1,11 +1,30 @@
 from abc import abstractmethod
+from concurrent.futures import CancelledError, Future
+import copy
+import fnmatch
+import hashlib
 import inspect
 import os
 import threading
+import time
 
 import sublime
 
+from .src import cancellation
+from .src import disk_cache
+from .src import event_loop
+from .src import executor
+from .src import intern
+from .src import scope
+from .src import stats
+from .src import streaming
+from .src.lru import LRUCache
+from .src.multiset import CompletionCounter, TypedCompletionCounter
+from .src.prefix_index import PrefixIndex, completion_trigger
+from .src.ranking import CompletionResult, SortedCompletions, is_flagged_result
+from .src.settings import get_setting
 from .src.shared import MiniPluginMeta
+from .src.view_index import ViewIndex, modified_lines
 
 try:
     import sublimelogging
@@ -46,11 +65,17 @@ class CompletionTrigger(object, metaclass=MiniPluginMeta):
     @classmethod
     def view_scope_check(cls, view):
         """Returns the score of the defined scope in the given view."""
+        return scope.max_score(view, [s.begin() for s in view.sel()],
+                               cls.get_view_selector())
+
+    @classmethod
+    def get_view_selector(cls):
+        """Return the result of view_scope, computing it once per class."""
         try:
-            return max([view.score_selector(s.begin(), cls.view_scope())
-                        for s in view.sel()])
-        except ValueError:
-            return view.score_selector(0, cls.view_scope())
+            return cls.__dict__['_view_selector']
+        except KeyError:
+            cls._view_selector = cls.view_scope()
+            return cls._view_selector
 
     @classmethod
     @abstractmethod
@@ -75,9 +100,10 @@ class CompletionTrigger(object, metaclass=MiniPluginMeta):
 
         """
         try:
-            return max([self.view.score_selector(l, self.selection_scope()) for l in locs])
-        except ValueError:
-            return self.view.score_selector(l[0], self.selection_scope)
+            selector = self._selection_selector
+        except AttributeError:
+            selector = self._selection_selector = self.selection_scope()
+        return scope.max_score(self.view, locs, selector)
 
     @abstractmethod
     def selection_scope(self):
@@ -121,13 +147,112 @@ class CompletionLoader(object, metaclass=MiniPluginMeta):
     """True to load completions asynchronously."""
     LoadAsync = False
 
+    """The minimum number of seconds between checks for stale completions.
+
+    refresh_completions is not called again until this many seconds have
+    passed since the last check or load, so a burst of requests does not
+    start redundant reloads. Use 0 to check on every request.
+    """
+    LoadDebounce = 0
+
+    """True to keep serving the current completions while they are reloaded.
+
+    When refresh_completions returns True, the completions are reloaded in
+    the background by a copy of the loader, and the current completions are
+    returned until the copy has finished. The copy's completions and state
+    then replace this loader's in one step. If the reload fails, the current
+    completions are kept. Only applies to loads that run in the background.
+    """
+    ServeStale = False
+
+    """True to start loading completions when a view is loaded or activated.
+
+    Only used if the prefetch_on_activation setting is true.
+    """
+    Prefetch = True
+
+    """True to parse completions in a worker process.
+
+    get_process_task returns a picklable function and its arguments. The
+    function is called in the shared process pool, and the completions it
+    returns are installed by install_process_result, so parsing does not hold
+    the interpreter lock of the plugin host. load_completions is called
+    instead if the process pool is disabled or cannot be used, or if
+    get_process_task returns None. Combine with
+    LoadAsync so the editor does not wait for the worker process.
+    """
+    LoadInProcess = False
+
+    """The priority of this loader's completions when they are ranked.
+
+    Completions from loaders with a higher priority rank above equally good
+    matches from other loaders.
+    """
+    Priority = 0
+
+    """True to keep the loaded completions in a prefix index.
+
+    The index is built once after load_completions runs. filter_completions
+    then returns only the completions whose trigger starts with the typed
+    prefix instead of every loaded completion.
+    """
+    PrefixIndexed = False
+
+    """True if filter_completions only returns the completions whose trigger
+    starts with the typed prefix.
+
+    Each view then keeps the loader's last result, and as the prefix grows
+    the result is narrowed instead of calling filter_completions again. This
+    only helps loaders with an expensive filter, so it is ignored if
+    PrefixIndexed is True; searching the prefix index is faster.
+    """
+    NarrowResults = False
+
+    """True to keep a copy of the loaded completions on disk.
+
+    On first use after a restart, completions are restored from the disk
+    cache instead of being loaded. The loader's normal change detection then
+    revalidates them against the source. View and cross-view loaders ignore
+    this, since their completions come from views that do not survive a
+    restart.
+    """
+    DiskCache = False
+
+    # Loader classes that have been warned that DiskCache is not supported.
+    DiskCacheRejected = set()
+
+    """True to store the loaded completions compactly.
+
+    Completion strings and tuples are interned in a process-wide pool, so
+    loaders that load the same completions share them. The loaded collection
+    is replaced with immutable, sorted tuples.
+    """
+    CompactCompletions = False
+
+    """The maximum number of instances of this class to keep in memory.
+
+    The least recently used instances are evicted first. Use None to use the
+    max_loader_instances setting, or 0 for no limit.
+    """
+    MaxInstances = None
+
+    """The number of seconds an instance can go unused before it is evicted.
+
+    Use None to use the loader_instance_ttl setting, or 0 for no limit.
+    """
+    InstanceTTL = None
+
+    # Incremented whenever an instance of any loader is evicted or removed.
+    EvictionGeneration = 0
+
     BeforeLoadCallbacks = []
 
     AfterLoadCallbacks = []
 
     def __new__(cls, *args, **kwargs):
         if 'Instances' not in cls.__dict__.keys():
-            cls.Instances = dict()
+            cls.Instances = LRUCache(limits=cls.get_instance_limits,
+                                     on_evict=cls.on_instance_evicted)
         return super(CompletionLoader, cls).__new__(cls)
 
     def __init__(self, *args, **kwargs):
@@ -140,9 +265,23 @@ class CompletionLoader(object, metaclass=MiniPluginMeta):
         """
         super(CompletionLoader, self).__init__()
         self.completions = []
+        self.completion_index = None
+        self.indexed_completions = None
+        self.generation = 0
+        self.completion_partitions = None
+        self.partitioned_completions = None
+        self.partition_generation = None
+        self.partition_collisions = set()
+        self.merged_completions = dict()
+        self.missing_types = set()
         self.loading = False
+        self.load_lock = threading.RLock()
+        self.last_refresh_check = 0
         self.add_instance()
-        self.loader_thread = None
+        self.loader_future = None
+        self.pending_loader = None
+        self.cancel_token = None
+        self.disk_cache_checked = False
 
     @property
     def instance_key(self):
@@ -157,6 +296,132 @@ class CompletionLoader(object, metaclass=MiniPluginMeta):
         """Adds the current instance to the Instances list."""
         self.Instances[self.instance_key] = self
 
+    def touch(self):
+        """Mark the instance as recently used in the Instances cache.
+
+        Views keep their loaders between requests, so the Instances cache is
+        not read each time a loader is used. Without this, a loader used on
+        every keystroke would look idle and be evicted.
+
+        """
+        self.Instances.touch(self.instance_key)
+
+    @classmethod
+    def get_instance_limits(cls):
+        """Return a tuple of (max_instances, ttl) for the Instances cache."""
+        max_instances = cls.MaxInstances
+        if max_instances is None:
+            max_instances = get_setting('max_loader_instances', 0)
+        ttl = cls.InstanceTTL
+        if ttl is None:
+            ttl = get_setting('loader_instance_ttl', 0)
+        return (max_instances or 0, ttl or 0)
+
+    @classmethod
+    def on_instance_evicted(cls, key, loader):
+        """Release an instance that was evicted from the Instances cache.
+
+        Views that cached the instance look up their loaders again on the
+        next request, so a new instance is created and loaded if needed.
+
+        """
+        logger.debug('Evicting %s', loader)
+        CompletionLoader.EvictionGeneration += 1
+        loader.release()
+
+    @classmethod
+    def remove_instance(cls, key):
+        """Remove and release the instance with the given key, if any."""
+        instances = cls.__dict__.get('Instances')
+        if instances is None:
+            return
+        loader = instances.pop(key, None)
+        if loader is not None:
+            cls.on_instance_evicted(key, loader)
+
+    def reject_disk_cache(self):
+        """Turn off DiskCache for a loader that cannot be cached on disk.
+
+        A warning is logged the first time for each class.
+
+        """
+        if not self.DiskCache:
+            return
+        if self.__class__ not in CompletionLoader.DiskCacheRejected:
+            CompletionLoader.DiskCacheRejected.add(self.__class__)
+            logger.warning('DiskCache is not supported by %s and is ignored',
+                           self.__class__.__name__)
+        self.DiskCache = False
+
+    def release(self):
+        """Cancel any running load and free the memory held by the completions."""
+        self.cancel_load()
+        self.discard_completions()
+
+    def cancel_load(self):
+        """Ask the running load, if any, to stop.
+
+        The load's cancellation token is cancelled, and a load that has not
+        started yet is not run. Loads stop the next time they check the
+        token, and their partial completions are discarded.
+
+        """
+        token = self.cancel_token
+        if token is not None:
+            token.cancel()
+        future = self.loader_future
+        if future is not None:
+            future.cancel()
+
+    @classmethod
+    def cancel_all_loads(cls):
+        """Cancel the running loads of every loader instance."""
+        for c in CompletionLoader.get_plugins():
+            instances = c.__dict__.get('Instances')
+            if instances is None:
+                continue
+            for loader in list(instances.values()):
+                loader.cancel_load()
+
+    def discard_completions(self):
+        """Free the memory held by the completions of this instance."""
+        self.generation += 1
+        self.completions = []
+        self.completion_index = None
+        self.indexed_completions = None
+        self.completion_partitions = None
+        self.partitioned_completions = None
+        self.partition_collisions = set()
+        self.merged_completions = dict()
+
+    @classmethod
+    def close_view(cls, view):
+        """Release the data held for a view that has been closed."""
+        for c in CompletionLoader.get_plugins():
+            c.on_view_closed(view)
+        ViewData.remove_view(view)
+        intern.maybe_prune()
+
+    @classmethod
+    def modify_view(cls, view):
+        """Notify every loader class that a view was modified or loaded."""
+        for c in CompletionLoader.get_plugins():
+            c.on_view_modified(view)
+
+    @classmethod
+    def on_view_modified(cls, view):
+        """Called when a view is modified or loaded. Does nothing by default."""
+        pass
+
+    @classmethod
+    def on_view_closed(cls, view):
+        """Called for each loader class when a view is closed.
+
+        Loaders that keep instances for a view should remove them here.
+
+        """
+        pass
+
     @classmethod
     @abstractmethod
     def completion_types(cls):
@@ -166,11 +431,17 @@ class CompletionLoader(object, metaclass=MiniPluginMeta):
     @classmethod
     def view_scope_check(cls, view):
         """Returns the score of the defined scope in the given view."""
+        return scope.max_score(view, [s.begin() for s in view.sel()],
+                               cls.get_view_selector())
+
+    @classmethod
+    def get_view_selector(cls):
+        """Return the result of view_scope, computing it once per class."""
         try:
-            return max([view.score_selector(s.begin(), cls.view_scope())
-                        for s in view.sel()])
-        except ValueError:
-            return view.score_selector(0, cls.view_scope())
+            return cls.__dict__['_view_selector']
+        except KeyError:
+            cls._view_selector = cls.view_scope()
+            return cls._view_selector
 
     @classmethod
     @abstractmethod
@@ -196,6 +467,31 @@ class CompletionLoader(object, metaclass=MiniPluginMeta):
         """Returns a list of instances of the given class to be used for the given view."""
         return [cls()]
 
+    @classmethod
+    def _get_active_loaders_for_view(cls, view):
+        """Returns a set of the CompletionLoader objects enabled for the view."""
+        loaders = set()
+        for c in CompletionLoader.get_plugins():
+            if c.full_view_check(view):
+                loaders.update(c.instances_for_view(view))
+        return loaders
+
+    @classmethod
+    def get_active_loaders_for_view(cls, view):
+        """Returns a set of the CompletionLoader objects enabled for the view.
+
+        The result is cached per view. Call clear_active_loaders_for_view if
+        the loaders for a view change for any reason other than a change to
+        the view's scope or settings or the registered loaders.
+
+        """
+        return ViewData.get_active_loaders_for_view(view)
+
+    @classmethod
+    def clear_active_loaders_for_view(cls, view):
+        """Clear the loaders cached for the view."""
+        ViewData.clear_active_loaders_for_view(view)
+
     @classmethod
     def add_loader_to_view(cls, view, **kwargs):
         l = cls(view = view, **kwargs)
@@ -233,58 +529,229 @@ class CompletionLoader(object, metaclass=MiniPluginMeta):
 
         This function normally will not be overridden.
         If the completer is set to load completions asynchronously (LoadAsync
-        is True), a thread is started to load the completions as long as wait
+        is True), loading is submitted to the shared executor as long as wait
         is false. If completions should be loaded synchronously, or wait is
         True, completions are loaded in the current thread. load_completions
-        is called either way to load the completions.
+        is called either way to load the completions. If load_completions is
+        a coroutine function, it is run on the shared event loop, and only
+        blocks the current thread if wait is True.
 
         """
         included_completions = set(completion_types).intersection(
             set(self.completion_types()))
         if not included_completions:
             return
+        self.touch()
         logger.debug("get_completions start: %s", self)
         logger.debug('included_completions = %s', included_completions)
         logger.debug("%s.loading = %s", self, self.loading)
 
-        # If completions are loaded but we need to refresh them, clear them
-        if self.completions and self.refresh_completions():
-            logger.debug("Reloading completions for %s", self)
-            self.completions = set()
+        # Only one caller at a time may check, start or finish a load, so
+        # overlapping calls share a single load of the completions.
+        with self.load_lock:
+            future = self._start_load(included_completions, wait, **kwargs)
+
+        # If another caller started the load and we need to wait on it, wait
+        # outside of the lock so the loading thread can finish.
+        if wait and (future is not None):
+            try:
+                future.result()
+            except (CancelledError, cancellation.LoadCancelled):
+                logger.debug('Load cancelled while waiting: %s', self)
+            except Exception:
+                logger.exception('Failed to load completions for %s', self)
+
+        with self.load_lock:
+            # If completions are loading and the load is still running,
+            # return empty, or the current completions if they are stale
+            if self.loading and ((self.loader_future is None) or
+                                 not self.loader_future.done()):
+                if self.pending_loader is None:
+                    completion_queue.put(self.EmptyReturn)
+                else:
+                    completion_queue.put(
+                        self._filter_completions(included_completions, **kwargs))
+            # Otherwise, set loading to False and return the completions
+            else:
+                if self.pending_loader is not None:
+                    self._install_pending_loader()
+                self.loading = False
+                self.loader_future = None
+                completion_queue.put(
+                    self._filter_completions(included_completions, **kwargs))
+        logger.debug("get_completions stop: %s", self)
+        return
+
+    @classmethod
+    def prefetch_view(cls, view):
+        """Start loading the completions of the loaders enabled for view.
+
+        The triggers and loaders for the view are looked up and cached, and
+        each loader with Prefetch set starts loading its completions if they
+        are not already loaded, so the first completion request for the view
+        does not have to wait for them. Synchronous loaders are loaded in
+        the current thread.
+
+        """
+        CompletionTrigger.get_triggers_for_view(view)
+        for l in cls.get_active_loaders_for_view(view):
+            if l.Prefetch:
+                try:
+                    with stats.timed('prefetch', l.__class__.__name__):
+                        l.prefetch(view=view)
+                except Exception:
+                    logger.exception('Failed to prefetch completions for %s', l)
+
+    def prefetch(self, **kwargs):
+        """Start loading the completions if they are not loaded or loading.
+
+        Returns the Future of a load running in the background, or None.
+
+        """
+        with self.load_lock:
+            if self.loading or self.completions:
+                return self.loader_future
+            return self._start_load(set(self.completion_types()), False,
+                                    **kwargs)
+
+    def _start_load(self, included_completions, wait, **kwargs):
+        """Refresh the completions and start loading them if needed.
+
+        Must be called with load_lock held. Returns the Future of a load that
+        is running in the background, or None.
+
+        """
+        now = time.time()
+        coroutine = event_loop.is_coroutine_function(self.load_completions)
+
+        # Collect a background load that has finished, so that a load that
+        # was cancelled can be started again by this request.
+        if (self.loading and (self.loader_future is not None) and
+                self.loader_future.done()):
+            if self.pending_loader is not None:
+                self._install_pending_loader()
+            self.loading = False
+            self.loader_future = None
+
+        # If the source changed again while a background load is running,
+        # cancel the load. A reload into a copy of the loader is restarted
+        # straight away. Otherwise the next request after the load stops
+        # starts a new one.
+        if (self.loading and (self.loader_future is not None) and
+                (now - self.last_refresh_check >= self.LoadDebounce)):
+            self.last_refresh_check = now
+            if self.is_load_superseded():
+                logger.debug("Cancelling superseded load for %s", self)
+                self.cancel_load()
+                if self.pending_loader is not None:
+                    self.pending_loader = None
+                    self._start_pending_loader(
+                        coroutine, included_completions=included_completions.copy(),
+                        **kwargs)
+                return self.loader_future
+
+        # If completions are loaded but we need to refresh them, clear them.
+        # Bursts of requests only check for changes once per LoadDebounce.
+        if (self.completions and (not self.loading) and
+                (now - self.last_refresh_check >= self.LoadDebounce)):
+            self.last_refresh_check = now
+            if self.refresh_completions():
+                logger.debug("Reloading completions for %s", self)
+                if self.ServeStale and (self.LoadAsync or coroutine) and not wait:
+                    self._start_pending_loader(
+                        coroutine, included_completions=included_completions.copy(),
+                        **kwargs)
+                    return self.loader_future
+                self.completions = set()
+
+        # On first use, try to restore completions from the disk cache
+        if (self.DiskCache and (not self.disk_cache_checked) and
+                (not self.loading) and (not self.completions)):
+            self.disk_cache_checked = True
+            self.load_from_disk_cache()
 
         # if we're not already loading completions, and they aren't loaded, load them.
         if (not self.loading) and (not self.completions):
             logger.debug("Loading completions for %s", self)
-            # If completions should be loaded asynchronously, and we don't want
-            # to wait on them, spawn a thread to load them.
-            if self.LoadAsync and not wait:
+            self.last_refresh_check = now
+            kwargs['included_completions'] = included_completions.copy()
+            kwargs['cancel_token'] = self.cancel_token = cancellation.CancellationToken()
+            # Coroutine loaders always run on the shared event loop, and
+            # asynchronous loaders run on the shared executor, unless we
+            # want to wait on them.
+            if coroutine and not wait:
+                self.loading = True
+                self.loader_future = self._load_completions_async(**kwargs)
+            elif self.LoadAsync and not wait:
                 self.loading = True
-                kwargs['included_completions'] = included_completions.copy()
-                self.loader_thread = threading.Thread(target = self.load_completions, kwargs = kwargs)
-                self.loader_thread.start()
+                self.loader_future = executor.submit(self._load_completions, **kwargs)
             # Otherwise, load them in the current thread
             else:
                 self.loading = True
-                self.load_completions(
-                    included_completions=included_completions.copy(), **kwargs)
-                self.loading = False
+                try:
+                    if coroutine:
+                        self._load_completions_async(**kwargs).result()
+                    else:
+                        self._load_completions(**kwargs)
+                except cancellation.LoadCancelled:
+                    pass
+                finally:
+                    self.loading = False
+        return self.loader_future
+
+    def _start_pending_loader(self, coroutine, **kwargs):
+        """Reload the completions in the background using a copy of this loader.
+
+        Must be called with load_lock held. The current completions are left
+        in place and served until _install_pending_loader is called.
 
-        if self.loading:
-            # If completions are loading and the thread is still active, return empty
-            if ((self.loader_thread is None) or self.loader_thread.is_alive()):
-                completion_queue.put(self.EmptyReturn)
-            # Otherwise, set loading to False and return the completions
-            else:
-                self.loading = False
-                completion_queue.put(
-                    self.filter_completions(included_completions, **kwargs))
-                self.loader_thread = None
-        # Otherwise, just return the completions
+        """
+        pending = copy.copy(self)
+        pending.completions = []
+        pending.completion_index = None
+        pending.indexed_completions = None
+        token = cancellation.CancellationToken()
+        pending.cancel_token = self.cancel_token = kwargs['cancel_token'] = token
+        self.pending_loader = pending
+        self.loading = True
+        if coroutine:
+            self.loader_future = pending._load_completions_async(**kwargs)
         else:
-            completion_queue.put(
-                self.filter_completions(included_completions, **kwargs))
-        logger.debug("get_completions stop: %s", self)
-        return
+            self.loader_future = executor.submit(pending._load_completions,
+                                                 **kwargs)
+
+    def _install_pending_loader(self):
+        """Replace this loader's state with the state of the pending loader.
+
+        Must be called with load_lock held, once the pending load is done. If
+        the pending load failed, the current completions are kept.
+
+        """
+        pending, self.pending_loader = self.pending_loader, None
+        future = self.loader_future
+        if (future is not None) and future.cancelled():
+            return
+        exc = None if future is None else future.exception()
+        if isinstance(exc, cancellation.LoadCancelled):
+            return
+        elif exc is not None:
+            logger.warning('Keeping stale completions for %s after a failed '
+                           'reload', self)
+            return
+        state = pending.__dict__.copy()
+        for attribute in ('load_lock', 'loading', 'loader_future',
+                          'pending_loader', 'last_refresh_check'):
+            state.pop(attribute, None)
+        self.__dict__.update(state)
+
+    def is_load_superseded(self):
+        """Return True if the running load is out of date and should be cancelled.
+
+        Called while a background load is running, at most once per
+        LoadDebounce. Returns False by default.
+
+        """
+        return False
 
     def refresh_completions(self):
         """Return True if the completions need to be reloaded."""
@@ -292,15 +759,485 @@ class CompletionLoader(object, metaclass=MiniPluginMeta):
 
     @abstractmethod
     def load_completions(self, **kwargs):
-        """Populate self.completions with the completions handled by this completer."""
+        """Populate self.completions with the completions handled by this completer.
+
+        This can be defined with async def to wait on I/O without blocking a
+        thread. The coroutine runs on the shared background event loop.
+
+        kwargs includes cancel_token, a CancellationToken that is cancelled
+        if the load is no longer needed. Long-running loads should call its
+        raise_if_cancelled method regularly. The token is also available as
+        self.cancel_token while the load is running.
+
+        """
+        pass
+
+    def _load_completions(self, **kwargs):
+        """Call load_completions and build the prefix index if it is enabled.
+
+        If DiskCache is True, the loaded completions are also written to the
+        disk cache. If the load is cancelled, its partial completions are
+        discarded and LoadCancelled is raised.
+
+        """
+        token = kwargs.get('cancel_token')
+        with stats.timed('load_completions', self.__class__.__name__):
+            signature = self.cache_signature() if self.DiskCache else None
+            try:
+                if not (self.LoadInProcess and self.load_in_process(**kwargs)):
+                    self.load_completions(**kwargs)
+                cancellation.raise_if_cancelled(token)
+            except cancellation.LoadCancelled:
+                logger.debug('Cancelled loading completions for %s', self)
+                self.discard_completions()
+                raise
+            self._finish_load(signature)
+
+    def _load_completions_async(self, **kwargs):
+        """Run the load_completions coroutine on the shared event loop.
+
+        Returns a concurrent.futures.Future that is done once the completions
+        are loaded and _finish_load has run. The coroutine does not occupy a
+        thread while it waits. _finish_load is submitted to the shared
+        executor, so indexing does not hold up the other coroutines on the
+        event loop.
+
+        """
+        start = time.perf_counter()
+        signature = self.cache_signature() if self.DiskCache else None
+        # The result is marked as running so that it cannot be cancelled.
+        # The load is cancelled through its cancellation token instead.
+        result = Future()
+        result.set_running_or_notify_cancel()
+        name = self.__class__.__name__
+
+        def finish():
+            try:
+                self._finish_load(signature)
+            except BaseException as e:
+                result.set_exception(e)
+            else:
+                result.set_result(None)
+            stats.record('load_completions', name,
+                         time.perf_counter() - start)
+
+        def on_loaded(load_future):
+            if load_future.cancelled() or token.cancelled:
+                exc = cancellation.LoadCancelled()
+            else:
+                exc = load_future.exception()
+            if isinstance(exc, cancellation.LoadCancelled):
+                logger.debug('Cancelled loading completions for %s', self)
+                self.discard_completions()
+            if exc is not None:
+                result.set_exception(exc)
+                return
+            try:
+                executor.submit(finish)
+            except RuntimeError:
+                # The executor was shut down while the coroutine was running
+                finish()
+
+        token = kwargs.setdefault('cancel_token',
+                                  cancellation.CancellationToken())
+        load_future = event_loop.run_coroutine(self.load_completions(**kwargs))
+        token.add_callback(load_future.cancel)
+        load_future.add_done_callback(on_loaded)
+        return result
+
+    def _finish_load(self, signature = None):
+        """Compact, index and cache newly loaded completions.
+
+        The generation of the completions is incremented, and if they are
+        not prefix indexed, they are partitioned by type.
+
+        Keyword arguments:
+        signature - The cache signature taken before the completions were
+                    loaded. Only used if DiskCache is True.
+
+        """
+        self.generation += 1
+        if self.CompactCompletions:
+            self.compact_loaded_completions()
+        if self.PrefixIndexed:
+            self.build_completion_index()
+        elif isinstance(self.completions, dict):
+            self.build_completion_partitions()
+        if self.DiskCache:
+            self.save_to_disk_cache(signature)
+        self.cancel_token = None
+
+    def get_process_task(self, **kwargs):
+        """Return a (function, args) tuple used to load completions in a process.
+
+        Keyword arguments:
+        kwargs - The keyword arguments passed to load_completions
+
+        Only used when LoadInProcess is True. function must be defined at the
+        module level and must not depend on the sublime module, and function
+        and args must be picklable. function(*args) must return the
+        completions in the form load_completions would store them in
+        self.completions.
+
+        Returns None by default, in which case load_completions is called
+        instead, as if the process pool could not be used.
+
+        """
+        return None
+
+    def load_in_process(self, **kwargs):
+        """Load completions in the shared process pool.
+
+        Returns False if the process pool cannot be used, in which case
+        load_completions should be called instead.
+
+        """
+        task = self.get_process_task(**kwargs)
+        if task is None:
+            logger.debug('%s has no process task, loading in this process', self)
+            return False
+        function, args = task
+        try:
+            result = executor.run_in_process(
+                function, *args, cancel_token=kwargs.get('cancel_token'))
+        except executor.ProcessPoolUnavailable:
+            return False
+        self.install_process_result(result)
+        return True
+
+    def install_process_result(self, result):
+        """Install the completions returned by the process task.
+
+        Override to keep additional state from the result.
+
+        """
+        self.completions = result
+
+    def _filter_completions(self, completion_types, result_cache = None,
+                            **kwargs):
+        """Call filter_completions, recording its latency and result size.
+
+        Keyword arguments:
+        completion_types - The types of completions that should be returned
+        result_cache - A dict of the last result of each loader for the view,
+                       used to narrow the result as the prefix grows
+
+        A (completions, flags) result, or a bare collection of completions,
+        is returned as a CompletionResult that includes the loader's
+        priority.
+
+        """
+        start = time.perf_counter()
+        prefix = kwargs.get('prefix') or ''
+        narrow = (result_cache is not None) and self.can_narrow_results()
+        result = None
+        if narrow:
+            key = (self.generation, frozenset(completion_types))
+            result = self.narrow_result(result_cache.get(self), key, prefix)
+        if result is None:
+            result = self.filter_completions(completion_types, **kwargs)
+        if isinstance(result, CompletionResult):
+            pass
+        elif is_flagged_result(result):
+            flags = result[1] if len(result) > 1 else 0
+            result = CompletionResult(result[0], flags, self.Priority)
+        elif result is not None:
+            result = CompletionResult(result, 0, self.Priority)
+        try:
+            count = len(result.completions)
+        except (AttributeError, TypeError):
+            count = None
+        stats.record('filter_completions', self.__class__.__name__,
+                     time.perf_counter() - start, count)
+        # Narrowing a result for an empty prefix would scan every completion
+        if narrow and prefix and (result is not None):
+            result_cache[self] = (key, prefix.lower(), result)
+        return result
+
+    def can_narrow_results(self):
+        """Return True if results can be narrowed as the prefix grows."""
+        return self.NarrowResults and not self.PrefixIndexed
+
+    def narrow_result(self, cached, key, prefix):
+        """Return a result narrowed from a cached result, or None.
+
+        Keyword arguments:
+        cached - A (key, prefix, result) tuple from the result cache, or None
+        key - The generation of the completions and the completion types
+        prefix - The text that has been typed
+
+        The cached result can only be used if the completions have not been
+        reloaded or patched since it was computed, the completion types are
+        the same, and prefix extends the cached prefix.
+
+        """
+        if cached is None:
+            return None
+        cached_key, cached_prefix, result = cached
+        lower_prefix = prefix.lower()
+        if (cached_key != key) or not lower_prefix.startswith(cached_prefix):
+            return None
+        if lower_prefix == cached_prefix:
+            return result
+        completions = SortedCompletions(
+            c for c in result.completions
+            if completion_trigger(c).lower().startswith(lower_prefix))
+        return result._replace(completions=completions)
+
+    def compact_loaded_completions(self):
+        """Replace self.completions with a compact, interned copy."""
+        self.completions = intern.compact_completions(self.completions)
+
+    @property
+    def disk_cache_key(self):
+        """Return the key used to store the completions in the disk cache."""
+        return (self.__class__.__module__, self.__class__.__name__,
+                self.instance_key)
+
+    def cache_signature(self):
+        """Return a value describing the state of the completion source.
+
+        The signature is computed before the completions are loaded and is
+        stored in the disk cache with them. It is passed to
+        restore_cache_signature when the completions are restored.
+
+        """
+        return None
+
+    def restore_cache_signature(self, signature):
+        """Set up change detection after completions are restored from disk.
+
+        This should be overridden by loaders that can detect changes to their
+        source, so that completions restored from the disk cache are
+        revalidated.
+
+        """
         pass
 
-    def filter_completions(self, completion_types, **kwargs):
+    def get_cache_state(self):
+        """Return the picklable state that is written to the disk cache."""
+        return {'completions': self.completions}
+
+    def set_cache_state(self, state):
+        """Restore the state returned by get_cache_state."""
+        self.completions = state['completions']
+
+    def save_to_disk_cache(self, signature = None):
+        """Write the completions and signature to the disk cache."""
+        disk_cache.write(self.disk_cache_key,
+                         (signature, self.get_cache_state()))
+
+    def load_from_disk_cache(self):
+        """Restore completions from the disk cache.
+
+        Returns True if completions were restored.
+
+        """
+        data = disk_cache.read(self.disk_cache_key)
+        if data is None:
+            return False
+        signature, state = data
+        try:
+            self.set_cache_state(state)
+        except Exception:
+            logger.exception('Failed to restore cached completions for %s', self)
+            return False
+        logger.debug('Restored completions for %s from the disk cache', self)
+        self.restore_cache_signature(signature)
+        return True
+
+    def build_completion_index(self):
+        """Build a prefix index for the loaded completions.
+
+        If self.completions is a dict, a PrefixIndex is built for each
+        completion type. Otherwise a single PrefixIndex is built.
+
+        """
+        completions = self.completions
+        if isinstance(completions, dict):
+            index = dict((t, PrefixIndex(c)) for t, c in completions.items())
+        else:
+            index = PrefixIndex(completions)
+        self.completion_index = index
+        self.indexed_completions = completions
+        return index
+
+    def update_completion_index(self, added, removed):
+        """Apply added and removed completions to an existing prefix index.
+
+        This is used by loaders that patch self.completions in place. added
+        and removed are lists of completions, or dicts of lists keyed by
+        completion type if self.completions is a dict. The generation of the
+        completions is incremented, and the cached partitions are patched
+        with the same changes.
+
+        """
+        self.patch_completion_partitions(added, removed)
+        index = self.completion_index
+        if (index is None) or (self.indexed_completions is not self.completions):
+            return
+        if isinstance(index, dict):
+            if not set(self.completions).issubset(index):
+                # A new completion type was added, so rebuild the index
+                self.completion_index = None
+                return
+            for t, completions in removed.items():
+                for c in completions:
+                    index[t].remove(c)
+            for t, completions in added.items():
+                for c in completions:
+                    index[t].add(c)
+        else:
+            for c in removed:
+                index.remove(c)
+            for c in added:
+                index.add(c)
+
+    def patch_completion_partitions(self, added, removed):
+        """Increment the generation and patch the cached partitions.
+
+        If the partitions were current, the changes are applied to each
+        sorted partition that they affect, so patching a few completions
+        does not re-sort the whole collection. Merged completions that
+        include a patched partition are dropped. Otherwise, or if a patched
+        partition has two completions with the same trigger, the partitions
+        are rebuilt on the next request.
+
+        """
+        current = ((self.partitioned_completions is self.completions) and
+                   (self.partition_generation == self.generation))
+        self.generation += 1
+        if not current:
+            return
+        completions = self.completions
+        if isinstance(completions, dict):
+            partitions = self.completion_partitions
+            if not set(completions).issubset(partitions):
+                return
+            patched = dict()
+            for t in set(added).union(removed):
+                if t in self.partition_collisions:
+                    return
+                partition = partitions[t].patch(completions[t],
+                                                added.get(t, ()),
+                                                removed.get(t, ()))
+                if partition is None:
+                    return
+                patched[t] = partition
+            partitions.update(patched)
+            self.merged_completions = dict(
+                (k, m) for k, m in self.merged_completions.items()
+                if k.isdisjoint(patched))
+        else:
+            merged = self.merged_completions.get(None)
+            if merged is not None:
+                if None in self.partition_collisions:
+                    return
+                merged = merged.patch(completions, added, removed)
+                if merged is None:
+                    return
+                self.merged_completions[None] = merged
+        self.partition_generation = self.generation
+
+    def get_completion_index(self):
+        """Return the prefix index for the loaded completions.
+
+        The index is rebuilt if self.completions has been replaced since the
+        index was built.
+
+        """
+        if ((self.completion_index is None) or
+                (self.indexed_completions is not self.completions)):
+            return self.build_completion_index()
+        return self.completion_index
+
+    def build_completion_partitions(self):
+        """Build an immutable, sorted partition of the completions of each type.
+
+        Only used if self.completions is a dict. The merged completions
+        cached for each combination of types are cleared.
+
+        """
+        completions = self.completions
+        self.completion_partitions = dict()
+        self.partition_collisions = set()
+        for t, c in completions.items():
+            self.completion_partitions[t] = self.sort_partition(t, c)
+        self.partitioned_completions = completions
+        self.partition_generation = self.generation
+        self.merged_completions = dict()
+        return self.completion_partitions
+
+    def sort_partition(self, key, completions):
+        """Return a SortedCompletions of completions.
+
+        If two completions have the same trigger, only one is kept, and key
+        is added to self.partition_collisions so the partition is rebuilt
+        rather than patched when the completions change.
+
+        """
+        partition = SortedCompletions.from_iterable(completions)
+        if len(partition) < len(completions):
+            self.partition_collisions.add(key)
+        return partition
+
+    def get_merged_completions(self, completion_types):
+        """Return a SortedCompletions of the completions of completion_types.
+
+        The result for each combination of types is cached, and is only
+        rebuilt after the completions are reloaded or patched. If
+        self.completions is not a dict, completion_types is ignored.
+
+        """
+        completions = self.completions
+        if ((self.partitioned_completions is not completions) or
+                (self.partition_generation != self.generation)):
+            if isinstance(completions, dict):
+                self.build_completion_partitions()
+            else:
+                self.completion_partitions = None
+                self.partition_collisions = set()
+                self.partitioned_completions = completions
+                self.partition_generation = self.generation
+                self.merged_completions = dict()
+
+        key = frozenset(completion_types) if isinstance(completions, dict) else None
+        try:
+            return self.merged_completions[key]
+        except KeyError:
+            pass
+
+        if key is None:
+            merged = self.sort_partition(None, completions)
+        else:
+            partitions = []
+            for t in key:
+                try:
+                    partitions.append(self.completion_partitions[t])
+                except KeyError:
+                    self.warn_missing_type(t)
+            if len(partitions) == 1:
+                merged = partitions[0]
+            else:
+                merged = SortedCompletions.merge(partitions)
+        self.merged_completions[key] = merged
+        return merged
+
+    def warn_missing_type(self, completion_type):
+        """Log a warning the first time a completion type is missing."""
+        if completion_type not in self.missing_types:
+            self.missing_types.add(completion_type)
+            logger.warning('CompletionLoader has no key "%s": %s',
+                           completion_type, self)
+
+    def filter_completions(self, completion_types, prefix = None, **kwargs):
         """Filters and returns the loaded completions based on the completion types requested.
 
         Keyword arguments:
         completion_types - The types of completions that should be returned in
                            this instance.
+        prefix - The text that has been typed. If PrefixIndexed is True, only
+                 completions whose trigger starts with prefix are returned.
 
         This function can be overridden by extending classes, but it usually
         will not need to be. self.completions can be either a dict datatype
@@ -311,16 +1248,27 @@ class CompletionLoader(object, metaclass=MiniPluginMeta):
 
         logger.debug('completion_types = %s', completion_types)
         logger.debug('self.completions = %s', self.completions)
-        if isinstance(self.completions, dict):
+        if self.PrefixIndexed:
+            index = self.get_completion_index()
+        else:
+            index = None
+
+        if index is None:
+            # The merged completions are cached, sorted and immutable
+            completions = self.get_merged_completions(completion_types)
+        elif isinstance(self.completions, dict):
             completions = set()
             for t in completion_types:
                 try:
-                    completions.update(self.completions[t])
+                    completions.update(index[t].search(prefix))
                 except KeyError:
-                    logger.warning('CompletionLoader has no key "%s": %s', t, self)
-
+                    self.warn_missing_type(t)
         else:
-            completions = set(self.completions)
+            completions = index.search(prefix)
+
+        # Prefix matches are few, so publish them sorted for the collector
+        if index is not None:
+            completions = SortedCompletions.from_iterable(completions)
 
         return (completions,
                 sublime.INHIBIT_WORD_COMPLETIONS | sublime.INHIBIT_EXPLICIT_COMPLETIONS)
@@ -375,6 +1323,7 @@ class ViewLoader(CompletionLoader):
 
     def __init__(self, view = None, **kwargs):
         self.view = view
+        self.reject_disk_cache()
         super(ViewLoader, self).__init__(**kwargs)
 
     def __repr__(self):
@@ -408,6 +1357,244 @@ class ViewLoader(CompletionLoader):
         """Return True if the completions need to be reloaded."""
         return True
 
+    @classmethod
+    def on_view_closed(cls, view):
+        """Remove the instance for the closed view."""
+        cls.remove_instance(view.id())
+
+
+class LineCompletionsMixin(object):
+    """Extracts the completions of a view line by line.
+
+    Used by loaders that keep the completions of each line, so that only
+    modified lines need to be re-extracted. Classes using this must define
+    extract_completions.
+
+    """
+
+    def get_line_completions(self, line):
+        """Return the completions from extract_completions as a tuple.
+
+        The completions are interned if CompactCompletions is True.
+
+        """
+        completions = self.extract_completions(line)
+        if self.CompactCompletions:
+            return tuple(intern.intern_completions(completions))
+        return tuple(completions)
+
+    def compact_loaded_completions(self):
+        """Do nothing, since completions are interned as they are extracted."""
+        pass
+
+
+class IncrementalViewLoader(LineCompletionsMixin, ViewLoader):
+    """ViewLoader that only re-extracts completions from modified lines.
+
+    Completions are extracted from each line of the view by
+    extract_completions. The view's change count is checked on each request.
+    If the view has been modified, the span of lines that changed since the
+    last load is found and only those lines are re-extracted. The
+    completions from the old lines are removed and the completions from the
+    new lines are added to the existing collection.
+
+    """
+
+    def __init__(self, view = None, **kwargs):
+        self.change_count = None
+        self.lines = []
+        self.line_completions = []
+        self.completion_counter = CompletionCounter()
+        super(IncrementalViewLoader, self).__init__(view = view, **kwargs)
+
+    @abstractmethod
+    def extract_completions(self, line):
+        """Return an iterable of the completions found in a line of the view."""
+        pass
+
+    def load_completions(self, **kwargs):
+        """Extract completions from every line of the view."""
+        self.change_count = self.view.change_count()
+        self.lines = self.get_view_lines()
+        self.line_completions = [self.get_line_completions(l)
+                                 for l in self.lines]
+        counter = CompletionCounter()
+        for c in self.line_completions:
+            counter.add(c)
+        self.completion_counter = counter
+        self.completions = counter.completions
+
+    def refresh_completions(self):
+        """Update the completions for lines modified since the last load.
+
+        The completions are patched in place, so this always returns False.
+
+        """
+        change_count = self.view.change_count()
+        if change_count != self.change_count:
+            self.update_completions(change_count)
+        return False
+
+    def get_view_lines(self):
+        """Return a list of the lines in the view."""
+        return self.view.substr(sublime.Region(0, self.view.size())).split('\n')
+
+    def get_modified_lines(self, lines):
+        """Return a tuple of (start, old_end, new_end) for the modified lines.
+
+        self.lines[start:old_end] were replaced by lines[start:new_end].
+
+        """
+        return modified_lines(self.lines, lines)
+
+    def update_completions(self, change_count):
+        """Re-extract completions from the lines modified since the last load."""
+        lines = self.get_view_lines()
+        start, old_end, new_end = self.get_modified_lines(lines)
+        logger.debug('%s: re-extracting lines %s-%s', self, start, new_end)
+        new_completions = [self.get_line_completions(l)
+                           for l in lines[start:new_end]]
+
+        counter = self.completion_counter
+        removed = []
+        for c in self.line_completions[start:old_end]:
+            removed.extend(counter.remove(c))
+        added = []
+        for c in new_completions:
+            added.extend(counter.add(c))
+
+        self.line_completions[start:old_end] = new_completions
+        self.lines = lines
+        self.change_count = change_count
+        self.update_completion_index(added, removed)
+
+
+class CrossViewLoader(LineCompletionsMixin, CompletionLoader):
+    """CompletionLoader for completions extracted from every open view.
+
+    A single instance keeps an index of the completions found in each view
+    that passes index_view_check. Views are indexed when the completions are
+    first loaded. After that, views that are modified or loaded are marked,
+    and only the modified lines of those views are re-extracted when the
+    completions are next requested. Closed views are dropped from the index.
+
+    """
+
+    def __init__(self, **kwargs):
+        self.view_index = ViewIndex(self.get_line_completions)
+        self.modified_views = dict()
+        self.reject_disk_cache()
+        super(CrossViewLoader, self).__init__(**kwargs)
+
+    def __repr__(self):
+        return self.__class__.__name__
+
+    @property
+    def instance_key(self):
+        """Return a unique key used to identify the CompletionLoader.
+
+        This is used when caching the instance.
+
+        """
+        return self.__class__.__name__
+
+    @classmethod
+    def instances_for_view(cls, view):
+        """Returns a list of instances of the given class to be used for the given view."""
+        instance = cls.get_instance()
+        if instance is None:
+            instance = cls()
+        return [instance]
+
+    @classmethod
+    def get_instance(cls):
+        """Return the instance of this class, or None if there isn't one."""
+        try:
+            return cls.Instances[cls.__name__]
+        except (KeyError, AttributeError):
+            return None
+
+    @abstractmethod
+    def extract_completions(self, line):
+        """Return an iterable of the completions found in a line of a view."""
+        pass
+
+    @classmethod
+    def index_view_check(cls, view):
+        """Return True if completions should be extracted from view.
+
+        By default, every view that the loader is enabled for is indexed.
+
+        """
+        return cls.full_view_check(view)
+
+    def load_completions(self, **kwargs):
+        """Index every open view.
+
+        The index is not thread-safe, and views can be modified or closed
+        while an asynchronous load or a prefetch runs, so each view is
+        indexed under load_lock.
+
+        """
+        with self.load_lock:
+            self.view_index.clear()
+            self.modified_views = dict()
+        for window in sublime.windows():
+            for view in window.views():
+                cancellation.raise_if_cancelled(self.cancel_token)
+                with self.load_lock:
+                    if view.is_valid() and self.index_view_check(view):
+                        self.index_view(view)
+        self.completions = self.view_index.completions
+
+    def refresh_completions(self):
+        """Re-index the views modified since the completions were requested.
+
+        The completions are patched in place, so this always returns False.
+
+        """
+        if self.modified_views:
+            views, self.modified_views = self.modified_views, dict()
+            for view in views.values():
+                if view.is_valid() and self.index_view_check(view):
+                    self.index_view(view)
+        return False
+
+    def index_view(self, view):
+        """Add view to the index, or update the lines modified since it was indexed."""
+        change_count = view.change_count()
+        if change_count == self.view_index.change_count(view.id()):
+            return
+        lines = view.substr(sublime.Region(0, view.size())).split('\n')
+        added, removed = self.view_index.update_view(view.id(), change_count,
+                                                     lines)
+        self.update_completion_index(added, removed)
+
+    def release(self):
+        """Free the memory held by the index as well as the completions."""
+        super(CrossViewLoader, self).release()
+        self.view_index.clear()
+        self.modified_views = dict()
+
+    @classmethod
+    def on_view_modified(cls, view):
+        """Mark the view to be re-indexed on the next request."""
+        instance = cls.get_instance()
+        if instance is not None:
+            with instance.load_lock:
+                instance.modified_views[view.id()] = view
+
+    @classmethod
+    def on_view_closed(cls, view):
+        """Drop the closed view from the index."""
+        instance = cls.get_instance()
+        if instance is None:
+            return
+        with instance.load_lock:
+            instance.modified_views.pop(view.id(), None)
+            removed = instance.view_index.remove_view(view.id())
+            instance.update_completion_index([], removed)
+
 
 class FileLoader(CompletionLoader):
     """CompletionLoader for completions extracted from another file.
@@ -417,6 +1604,15 @@ class FileLoader(CompletionLoader):
 
     """
 
+    """The encoding used by the streaming methods to decode the file."""
+    FileEncoding = 'utf-8'
+
+    """Check the modification time of the file at most twice a second."""
+    LoadDebounce = 0.5
+
+    """The number of bytes passed to parse_chunk at a time by parse_file."""
+    ChunkSize = streaming.DEFAULT_CHUNK_SIZE
+
     def __init__(self, file_path = None, **kwargs):
         self.file_path = file_path
         self.last_modified_time = self.get_file_update_time()
@@ -442,10 +1638,32 @@ class FileLoader(CompletionLoader):
         self.last_modified_time = t
         return True
 
+    def is_load_superseded(self):
+        """Return True if the file was modified after the running load started."""
+        return self.refresh_completions()
+
     def get_file_update_time(self):
         """Return the last time the file was modified."""
         return os.path.getmtime(self.file_path)
 
+    def cache_signature(self):
+        """Return the modification time and size of the file."""
+        stat = os.stat(self.file_path)
+        return (stat.st_mtime, stat.st_size)
+
+    def restore_cache_signature(self, signature):
+        """Reload the completions if the file changed after they were cached."""
+        if signature is None:
+            return
+        try:
+            current = self.cache_signature()
+        except OSError:
+            return
+        if current != tuple(signature):
+            self.last_modified_time = 0
+        else:
+            self.last_modified_time = signature[0]
+
     @property
     def file_contents(self):
         """Reads in a file, returning each line in a list. Newlines are removed."""
@@ -460,6 +1678,50 @@ class FileLoader(CompletionLoader):
             contents = f.read()
         return contents
 
+    def iter_lines(self):
+        """Yield each line of the file. Newlines are removed.
+
+        The file is read in blocks, so the whole file is never held in memory
+        as text. The streaming methods stop with LoadCancelled if the load
+        that is running is cancelled.
+
+        """
+        return streaming.iter_lines(self.file_path, self.FileEncoding,
+                                    cancel_token=self.cancel_token)
+
+    def iter_records(self, separator = b'\n'):
+        """Yield each record of the file delimited by the bytes separator."""
+        return streaming.iter_records(self.file_path, separator,
+                                      self.FileEncoding,
+                                      cancel_token=self.cancel_token)
+
+    def iter_chunks(self, chunk_size = None):
+        """Yield the file in chunks of text that end on a line boundary."""
+        return streaming.iter_chunks(self.file_path,
+                                     chunk_size or self.ChunkSize,
+                                     self.FileEncoding,
+                                     cancel_token=self.cancel_token)
+
+    def parse_file(self, chunk_size = None):
+        """Pass each chunk of the file to parse_chunk.
+
+        This allows load_completions to build completions in a single pass
+        without holding the whole file in memory.
+
+        """
+        for chunk in self.iter_chunks(chunk_size):
+            self.parse_chunk(chunk)
+
+    def parse_chunk(self, chunk):
+        """Parse a chunk of text from the file.
+
+        This is called by parse_file and should be overridden by loaders that
+        use it.
+
+        """
+        raise NotImplementedError(
+            '%s does not implement parse_chunk' % self.__class__.__name__)
+
 
 class PathLoader(CompletionLoader):
     """CompletionLoader for completions extracted from a fixed path.
@@ -469,8 +1731,25 @@ class PathLoader(CompletionLoader):
 
     """
 
+    """Glob patterns matching the files in the path that provide completions."""
+    FilePatterns = ('*',)
+
+    """True to include files in subdirectories of the path."""
+    Recursive = False
+
+    """True to include a hash of each file's contents in the manifest.
+
+    By default only the modification time and size of each file are used to
+    detect changes. With HashFiles, a file is only hashed when its
+    modification time or size changes, and it only counts as changed if its
+    contents did, so touching a file does not re-parse it.
+    """
+    HashFiles = False
+
     def __init__(self, path = None, **kwargs):
         self.path = path
+        self.manifest = dict()
+        self.cache_invalid = False
         super(PathLoader, self).__init__(**kwargs)
 
     def __repr__(self):
@@ -485,28 +1764,426 @@ class PathLoader(CompletionLoader):
         """
         return self.path
 
+    def refresh_completions(self):
+        """Return True if the completions need to be reloaded.
+
+        This is True once if completions restored from the disk cache are
+        found to be out of date.
+
+        """
+        if self.cache_invalid:
+            self.cache_invalid = False
+            return True
+        return False
+
+    def cache_signature(self):
+        """Return the manifest of the files in the path."""
+        return self.scan_path()[3]
+
+    def restore_cache_signature(self, signature):
+        """Revalidate the restored completions in the background."""
+        if signature is None:
+            return
+        self.manifest = signature
+        executor.submit(self.revalidate_disk_cache, signature)
+
+    def revalidate_disk_cache(self, signature):
+        """Mark the completions for reloading if the path has changed."""
+        added, changed, removed, manifest = self.scan_path()
+        if added or changed or removed:
+            logger.debug('Cached completions for %s are out of date', self)
+            self.cache_invalid = True
+
+    def list_files(self):
+        """Return a list of the files in the path matching FilePatterns."""
+        files = []
+        for dir_path, dir_names, file_names in os.walk(self.path):
+            for f in file_names:
+                if any(fnmatch.fnmatch(f, p) for p in self.FilePatterns):
+                    files.append(os.path.join(dir_path, f))
+            if not self.Recursive:
+                break
+        return files
+
+    def get_file_signature(self, file_path, old_signature = None):
+        """Return a tuple used to detect changes to a file.
+
+        The tuple contains the modification time and size of the file, and a
+        hash of its contents if HashFiles is True. The file is only hashed if
+        old_signature, its previous signature, has a different modification
+        time or size.
+
+        """
+        stat = os.stat(file_path)
+        if not self.HashFiles:
+            return (stat.st_mtime, stat.st_size)
+        if ((old_signature is not None) and (len(old_signature) == 3) and
+                (tuple(old_signature[:2]) == (stat.st_mtime, stat.st_size))):
+            return tuple(old_signature)
+        digest = hashlib.md5()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                digest.update(block)
+        return (stat.st_mtime, stat.st_size, digest.hexdigest())
+
+    def file_changed(self, old_signature, signature):
+        """Return True if a file with old_signature now has signature.
+
+        If both signatures include a hash, only the hashes are compared.
+
+        """
+        if self.HashFiles and (len(old_signature) == len(signature) == 3):
+            return old_signature[2] != signature[2]
+        return tuple(old_signature) != tuple(signature)
+
+    def scan_path(self):
+        """Compare the files in the path to self.manifest.
+
+        Returns a tuple of (added, changed, removed, manifest). The first three
+        are lists of file paths. manifest is a dict of file signatures keyed
+        by file path for the files currently in the path. self.manifest is
+        not updated.
+
+        """
+        old_manifest = self.manifest
+        manifest = dict()
+        for f in self.list_files():
+            try:
+                manifest[f] = self.get_file_signature(f, old_manifest.get(f))
+            except OSError:
+                # The file was removed after it was listed
+                pass
+
+        added = [f for f in manifest if f not in old_manifest]
+        changed = [f for f, s in manifest.items()
+                   if (f in old_manifest) and
+                   self.file_changed(old_manifest[f], s)]
+        removed = [f for f in old_manifest if f not in manifest]
+        return (added, changed, removed, manifest)
+
+
+class IncrementalPathLoader(PathLoader):
+    """PathLoader that only re-parses the files that changed.
+
+    Completions are loaded from each file in the path by load_file. When the
+    completions are requested, the path is rescanned in the background at
+    most once every RefreshInterval seconds. Files that were added or
+    changed are re-parsed, and the completions from changed or removed files
+    are removed from the existing collection. The current completions are
+    returned until the rescan finishes.
+
+    """
+
+    """The minimum number of seconds between scans of the path."""
+    RefreshInterval = 1.0
+
+    def __init__(self, path = None, **kwargs):
+        self.file_completions = dict()
+        self.completion_counter = None
+        self.last_scan_time = 0
+        self.rescan_future = None
+        self.rescan_token = None
+        super(IncrementalPathLoader, self).__init__(path = path, **kwargs)
+
+    @abstractmethod
+    def load_file(self, file_path):
+        """Return the completions found in a file.
+
+        The completions can be an iterable of completions, or a dict of
+        iterables keyed by completion type.
+
+        """
+        pass
+
+    def get_file_task(self, file_path):
+        """Return a (function, args) tuple used to load a file in a process.
+
+        Only used when LoadInProcess is True. function(*args) must return
+        the same completions as load_file(file_path), and function and args
+        must be picklable. Each added or changed file is sent to the process
+        pool separately, so the files are parsed in parallel.
+
+        Returns None by default, in which case the files are loaded by
+        load_file instead, as if the process pool could not be used.
+
+        """
+        return None
+
+    def load_in_process(self, **kwargs):
+        """Return False. Files are sent to the process pool by update_completions."""
+        return False
+
+    def submit_files_to_process(self, file_paths):
+        """Return a dict of process pool Futures for file_paths.
+
+        The dict is empty if LoadInProcess is False or the process pool
+        cannot be used.
+
+        """
+        futures = dict()
+        if not self.LoadInProcess:
+            return futures
+        for f in file_paths:
+            task = self.get_file_task(f)
+            if task is None:
+                break
+            function, args = task
+            try:
+                futures[f] = executor.submit_to_process(function, *args)
+            except executor.ProcessPoolUnavailable:
+                break
+        return futures
+
+    def load_completions(self, **kwargs):
+        """Load completions from every file in the path."""
+        self.manifest = dict()
+        self.file_completions = dict()
+        self.completion_counter = None
+        self.update_completions()
+
+    def refresh_completions(self):
+        """Start a rescan of the path if RefreshInterval has passed.
+
+        The rescan runs on the shared executor and patches the completions
+        in place when it finishes, so this always returns False.
+
+        """
+        future = self.rescan_future
+        if (((future is None) or future.done()) and
+                (time.time() - self.last_scan_time) >= self.RefreshInterval):
+            self.last_scan_time = time.time()
+            token = self.rescan_token = cancellation.CancellationToken()
+            self.rescan_future = executor.submit(self.rescan, token)
+        return False
+
+    def rescan(self, cancel_token):
+        """Scan the path and apply the changes, unless the rescan is cancelled.
+
+        The files are scanned and parsed without holding load_lock. The
+        changes are discarded if the completions were reloaded while the
+        rescan ran.
+
+        """
+        manifest = self.manifest
+        changes = None
+        try:
+            changes = self.scan_changes(cancel_token)
+        finally:
+            with self.load_lock:
+                self.rescan_future = None
+                if ((changes is not None) and not cancel_token.cancelled and
+                        not self.loading and (self.manifest is manifest)):
+                    if self.apply_changes(*changes) and self.DiskCache:
+                        self.save_to_disk_cache()
+
+    def cancel_load(self):
+        """Ask the running load and the running rescan, if any, to stop."""
+        super(IncrementalPathLoader, self).cancel_load()
+        token = self.rescan_token
+        if token is not None:
+            token.cancel()
+
+    def cache_signature(self):
+        """Return None, since the manifest is stored in the cache state."""
+        return None
+
+    def restore_cache_signature(self, signature):
+        """Do nothing. The next refresh rescans the restored manifest."""
+        pass
+
+    def get_cache_state(self):
+        """Return the manifest and the completions for each file."""
+        return {'manifest': self.manifest,
+                'file_completions': self.file_completions}
+
+    def set_cache_state(self, state):
+        """Rebuild the completions from the cached completions for each file."""
+        file_completions = state['file_completions']
+        counter = None
+        for c in file_completions.values():
+            if counter is None:
+                if isinstance(c, dict):
+                    counter = TypedCompletionCounter()
+                else:
+                    counter = CompletionCounter()
+            counter.add(c)
+        self.manifest = state['manifest']
+        self.file_completions = file_completions
+        self.completion_counter = counter
+        if counter is not None:
+            self.completions = counter.completions
+        self.last_scan_time = 0
+
+    def update_completions(self):
+        """Re-parse the files that changed and merge their completions.
+
+        Returns True if any files were added, changed or removed.
+
+        """
+        self.last_scan_time = time.time()
+        return self.apply_changes(*self.scan_changes(self.cancel_token))
+
+    def scan_changes(self, cancel_token = None):
+        """Scan the path and load the files that were added or changed.
+
+        Returns a tuple of (manifest, changed, removed, contributions), where
+        contributions is a list of (file_path, completions) tuples for the
+        added and changed files. The loaded completions are not modified.
+
+        """
+        added, changed, removed, manifest = self.scan_path()
+        contributions = []
+        if not (added or changed or removed):
+            return (manifest, changed, removed, contributions)
+        logger.debug('%s: %s added, %s changed, %s removed', self,
+                     len(added), len(changed), len(removed))
+
+        futures = self.submit_files_to_process(added + changed)
+        try:
+            for f in added + changed:
+                cancellation.raise_if_cancelled(cancel_token)
+                try:
+                    contributions.append(
+                        (f, self.get_file_contribution(f, futures.get(f),
+                                                       cancel_token)))
+                except (IOError, OSError):
+                    logger.exception('Failed to load completions from %s', f)
+                    manifest.pop(f, None)
+        except cancellation.LoadCancelled:
+            for future in futures.values():
+                future.cancel()
+            raise
+        return (manifest, changed, removed, contributions)
+
+    def apply_changes(self, manifest, changed, removed, contributions):
+        """Merge the changes returned by scan_changes into the completions.
+
+        Returns True if any files were added, changed or removed.
+
+        """
+        if not (changed or removed or contributions):
+            # Keep the new modification times of files that did not change
+            self.manifest = manifest
+            return False
+
+        if self.completion_counter is None:
+            if contributions and isinstance(contributions[0][1], dict):
+                self.completion_counter = TypedCompletionCounter()
+            else:
+                self.completion_counter = CompletionCounter()
+        counter = self.completion_counter
+        typed = isinstance(counter, TypedCompletionCounter)
+
+        all_added = dict() if typed else []
+        all_removed = dict() if typed else []
+        for f in changed + removed:
+            try:
+                old = self.file_completions.pop(f)
+            except KeyError:
+                continue
+            self.merge_changes(all_removed, counter.remove(old))
+        for f, new in contributions:
+            if isinstance(new, dict) != typed:
+                logger.error('%s: completions from %s do not match the type '
+                             'of the other files', self, f)
+                manifest.pop(f, None)
+                continue
+            self.file_completions[f] = new
+            self.merge_changes(all_added, counter.add(new))
+
+        self.manifest = manifest
+        self.completions = counter.completions
+        self.update_completion_index(all_added, all_removed)
+        return True
+
+    def get_file_contribution(self, file_path, future = None,
+                              cancel_token = None):
+        """Return the completions from load_file as immutable collections.
+
+        Keyword arguments:
+        file_path - The file to load
+        future - A process pool Future for the file's completions, if any
+        cancel_token - The token of the load or rescan, used to stop waiting
+                       on future
+
+        The completions are interned if CompactCompletions is True. If the
+        process pool fails before future completes, the file is loaded by
+        load_file instead.
+
+        """
+        completions = None
+        if future is not None:
+            try:
+                completions = executor.process_result(future, cancel_token)
+            except executor.ProcessPoolUnavailable:
+                pass
+        if completions is None:
+            completions = self.load_file(file_path)
+        if self.CompactCompletions:
+            if isinstance(completions, dict):
+                return dict((t, tuple(intern.intern_completions(c)))
+                            for t, c in completions.items())
+            return tuple(intern.intern_completions(completions))
+        if isinstance(completions, dict):
+            return dict((t, tuple(c)) for t, c in completions.items())
+        return tuple(completions)
+
+    def compact_loaded_completions(self):
+        """Do nothing, since completions are interned as each file is loaded."""
+        pass
+
+    @staticmethod
+    def merge_changes(changes, new_changes):
+        """Extend changes with new_changes, both lists or dicts of lists."""
+        if isinstance(changes, dict):
+            for t, c in new_changes.items():
+                changes.setdefault(t, []).extend(c)
+        else:
+            changes.extend(new_changes)
+
 
 class ViewData(object):
-    """Stores data for a view."""
+    """Stores data for a view.
+
+    The data is removed when the view is closed. At most max_view_data
+    entries are kept; the least recently used are evicted first.
+
+    """
 
-    Data = dict()
+    Data = LRUCache(limits=lambda: (get_setting('max_view_data', 0), 0))
 
     def __init__(self, view):
         super(ViewData, self).__init__()
-        ViewData.Data[view.id()] = self
         self.id = view.id()
         self.scope = ViewData.scope_from_view(view)
         self.update_triggers(view)
         self.loaders = set()
+        self.active_loaders = None
+        self.active_loaders_key = None
+        self.result_cache = dict()
+        self.settings_generation = 0
 
     @classmethod
     def get_data(cls, view):
-        """Return a ViewData object for the specified view."""
+        """Return a ViewData object for the specified view.
+
+        Views can be looked up from the main thread and the async thread at
+        the same time, so a new ViewData is only published in Data once it
+        is fully initialized, and only one is kept for each view.
+
+        """
         try:
             return cls.Data[view.id()]
         except KeyError:
-            d = ViewData(view)
-            return d
+            pass
+        d = ViewData(view)
+        with cls.Data.lock:
+            try:
+                return cls.Data[view.id()]
+            except KeyError:
+                cls.Data[view.id()] = d
+        d.watch_settings(view)
+        return d
 
     @classmethod
     def get_triggers_for_view(cls, view):
@@ -519,13 +2196,79 @@ class ViewData(object):
         """
         d = cls.get_data(view)
         scope = ViewData.scope_from_view(view)
-        hash_ = ViewData.get_triggers_hash()
-        if ((d.scope != scope) or (d.triggers_hash != hash_)):
-            d.scope = scope
+        generation = CompletionTrigger.get_generation()
+        if ((d.scope != scope) or (d.triggers_generation != generation)):
             d.update_triggers(view)
+            d.scope = scope
 
         return d.triggers
 
+    @classmethod
+    def get_active_loaders_for_view(cls, view):
+        """Returns a set of the CompletionLoader instances enabled for a view.
+
+        The loaders are cached along with the primary source scope of the
+        view, the generation of the registered CompletionLoader classes, the
+        number of loader instances that have been evicted and the generation
+        of the view's settings. If any of these change, the
+        loaders are recomputed.
+
+        """
+        d = cls.get_data(view)
+        key = (ViewData.scope_from_view(view),
+               CompletionLoader.get_generation(),
+               CompletionLoader.EvictionGeneration,
+               d.settings_generation)
+        if d.active_loaders_key != key:
+            # Set the key last, so that a request from another thread never
+            # sees the new key before the loaders are ready
+            loaders = CompletionLoader._get_active_loaders_for_view(view)
+            d.active_loaders = loaders
+            d.result_cache = dict()
+            d.active_loaders_key = key
+            return loaders
+
+        return d.active_loaders
+
+    @classmethod
+    def get_result_cache(cls, view):
+        """Return the dict of the last filtered result of each loader for a view.
+
+        The dict is cleared whenever the loaders for the view are recomputed.
+
+        """
+        return cls.get_data(view).result_cache
+
+    @classmethod
+    def clear_active_loaders_for_view(cls, view):
+        """Clear the cached loaders so they are recomputed on the next request."""
+        d = cls.get_data(view)
+        d.active_loaders_key = None
+        d.active_loaders = None
+
+    @classmethod
+    def remove_view(cls, view):
+        """Remove the data for a view."""
+        d = cls.Data.pop(view.id(), None)
+        scope.clear_view(view.id())
+        if d is not None:
+            view.settings().clear_on_change('DynamicCompletions')
+
+    def watch_settings(self, view):
+        """Increment settings_generation whenever the view's settings change.
+
+        The cached scope names for the view are also cleared, since a change
+        of syntax changes the scopes without modifying the view.
+
+        """
+        def on_change():
+            self.settings_generation += 1
+            scope.clear_view(self.id)
+
+        settings = view.settings()
+        settings.clear_on_change('DynamicCompletions')
+        settings.add_on_change('DynamicCompletions', on_change)
+
     @classmethod
     def add_loader_to_view(cls, view, loader):
         d = cls.get_data(view)
@@ -545,8 +2288,9 @@ class ViewData(object):
         return d.loaders
 
     def update_triggers(self, view):
-        self.triggers_hash = ViewData.get_triggers_hash()
+        generation = CompletionTrigger.get_generation()
         self.triggers = CompletionTrigger._get_triggers_for_view(view)
+        self.triggers_generation = generation
 
     @staticmethod
     def scope_from_view(view):
@@ -558,10 +2302,6 @@ class ViewData(object):
 
         return scope.split(' ')[0]
 
-    @staticmethod
-    def get_triggers_hash():
-        return hash(str(CompletionTrigger.get_plugins()))
-
     @classmethod
     def set_view_attr(cls, view, name, value):
         d = cls.get_data(view)
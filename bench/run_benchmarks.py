@@ -0,0 +1,336 @@
+"""Headless benchmarks for the DynamicCompletions hot path.
+
+The benchmarks run outside of Sublime Text using the stand-in sublime and
+sublime_plugin modules in bench/stubs. Synthetic triggers and Static, View,
+File and Path loaders are registered, then typing is simulated in a fake
+view and DynamicCompletionsCommand.on_query_completions is called for each
+keystroke.
+
+Usage:
+    python bench/run_benchmarks.py [--words N] [--keystrokes N] ...
+
+Run with --help for the list of options.
+
+"""
+import argparse
+import importlib
+import importlib.util
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+from queue import Queue
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(BENCH_DIR)
+PACKAGE_NAME = 'DynamicCompletions'
+
+SCOPE = 'source.bench'
+COMPLETION_TYPE = 'word'
+
+
+def import_package():
+    """Import the package under its Sublime name using the stub modules."""
+    sys.path.insert(0, os.path.join(BENCH_DIR, 'stubs'))
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME, os.path.join(PACKAGE_DIR, '__init__.py'),
+        submodule_search_locations=[PACKAGE_DIR])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = package
+    spec.loader.exec_module(package)
+    commands = importlib.import_module(PACKAGE_NAME + '.Commands')
+    return package, commands
+
+
+def random_words(rng, count, min_length = 3, max_length = 12):
+    """Return a list of count random lowercase words."""
+    letters = string.ascii_lowercase
+    return [''.join(rng.choice(letters)
+                    for _ in range(rng.randint(min_length, max_length)))
+            for _ in range(count)]
+
+
+def word_generator(rng, vocabulary_size):
+    """Return a function that returns a list of count words.
+
+    If vocabulary_size is greater than 0, words are drawn from a shared
+    vocabulary of that many words, so the loaders see overlapping words as
+    they would for related include files. Otherwise every word is random.
+
+    """
+    if vocabulary_size <= 0:
+        return lambda count: random_words(rng, count)
+    vocabulary = random_words(rng, vocabulary_size)
+    return lambda count: [rng.choice(vocabulary) for _ in range(count)]
+
+
+def write_corpus(words, directory, file_count, words_per_file):
+    """Write file_count files of words to directory."""
+    files = []
+    for i in range(file_count):
+        file_path = os.path.join(directory, 'include%05d.inc' % i)
+        with open(file_path, 'w') as f:
+            f.write('\n'.join(words(words_per_file)))
+            f.write('\n')
+        files.append(file_path)
+    return files
+
+
+def read_words(file_path):
+    """Return the words in a file. Used by the loaders in worker processes."""
+    with open(file_path) as f:
+        return {COMPLETION_TYPE: f.read().split()}
+
+
+def define_plugins(dc, options, static_words, file_path, path):
+    """Define and register the synthetic triggers and loaders."""
+    plugins = []
+
+    def view_scope(cls):
+        return SCOPE
+
+    for i in range(options.triggers):
+        matches = (i == 0)
+
+        def selection_check(self, prefix, locs, matches = matches):
+            return [COMPLETION_TYPE] if matches else []
+
+        plugins.append(type('BenchTrigger%d' % i, (dc.CompletionTrigger,), {
+            'view_scope': classmethod(view_scope),
+            'selection_scope': lambda self: SCOPE,
+            'selection_check': selection_check,
+        }))
+
+    def completion_types(cls):
+        return {COMPLETION_TYPE}
+
+    loader_attrs = {
+        'view_scope': classmethod(view_scope),
+        'completion_types': classmethod(completion_types),
+        'PrefixIndexed': options.prefix_index,
+        'CompactCompletions': options.compact,
+    }
+
+    def load_static(self, **kwargs):
+        self.completions = {COMPLETION_TYPE: set(static_words)}
+
+    attrs = dict(loader_attrs, load_completions=load_static)
+    plugins.append(type('BenchStaticLoader', (dc.StaticLoader,), attrs))
+
+    def extract_completions(self, line):
+        return line.split()
+
+    attrs = dict(loader_attrs, extract_completions=extract_completions)
+    plugins.append(type('BenchViewLoader', (dc.IncrementalViewLoader,), attrs))
+
+    def file_instances(cls, view):
+        try:
+            return [cls.Instances[file_path]]
+        except (KeyError, AttributeError):
+            return [cls(file_path=file_path)]
+
+    def load_file_completions(self, **kwargs):
+        self.completions = {COMPLETION_TYPE: set(self.iter_lines())}
+
+    def file_process_task(self, **kwargs):
+        return (read_words, (self.file_path,))
+
+    attrs = dict(loader_attrs, LoadAsync=True, LoadInProcess=options.process,
+                 instances_for_view=classmethod(file_instances),
+                 load_completions=load_file_completions,
+                 get_process_task=file_process_task)
+    plugins.append(type('BenchFileLoader', (dc.FileLoader,), attrs))
+
+    def path_instances(cls, view):
+        try:
+            return [cls.Instances[path]]
+        except (KeyError, AttributeError):
+            return [cls(path=path)]
+
+    def load_file(self, file_path):
+        return read_words(file_path)
+
+    def file_task(self, file_path):
+        return (read_words, (file_path,))
+
+    attrs = dict(loader_attrs, LoadAsync=True, LoadInProcess=options.process,
+                 FilePatterns=('*.inc',),
+                 instances_for_view=classmethod(path_instances),
+                 load_file=load_file, get_file_task=file_task)
+    plugins.append(type('BenchPathLoader', (dc.IncrementalPathLoader,), attrs))
+
+    return plugins
+
+
+def percentile(samples, percent):
+    """Return the given percentile of a sorted list of samples."""
+    if not samples:
+        return 0.0
+    return samples[int(round((percent / 100.0) * (len(samples) - 1)))]
+
+
+def run(options):
+    rng = random.Random(options.seed)
+    if options.trace_memory:
+        tracemalloc.start()
+    dc, commands = import_package()
+    sublime = sys.modules['sublime']
+    settings = sublime.load_settings('DynamicCompletions.sublime-settings')
+    if options.max_completions is not None:
+        settings.set('max_completions', options.max_completions)
+
+    work_dir = tempfile.mkdtemp(prefix='dynamic_completions_corpus_')
+    try:
+        words = word_generator(rng, options.vocabulary)
+        static_words = words(options.words)
+        file_path = write_corpus(words, work_dir, 1, options.words)[0]
+        path = os.path.join(work_dir, 'path')
+        os.mkdir(path)
+        write_corpus(words, path, options.files,
+                     max(1, options.words // max(1, options.files)))
+
+        define_plugins(dc, options, static_words, file_path, path)
+
+        view_words = words(options.lines * 8)
+        text = '\n'.join(' '.join(view_words[i:i + 8])
+                         for i in range(0, len(view_words), 8))
+        view = sublime.View(text + '\n', SCOPE)
+        view.set_cursors(sorted(rng.randint(0, view.size())
+                                for _ in range(options.cursors)))
+
+        listener = commands.DynamicCompletionsCommand()
+
+        # Load every loader before timing the keystrokes
+        load_start = time.perf_counter()
+        for l in dc.CompletionLoader.get_active_loaders_for_view(view):
+            l.get_completions([COMPLETION_TYPE], Queue(), wait=True, view=view)
+        load_time = time.perf_counter() - load_start
+
+        latencies = []
+        completion_counts = []
+        letters = string.ascii_lowercase
+        prefix = ''
+        run_start = time.perf_counter()
+        for i in range(options.keystrokes):
+            if i % options.word_length == 0:
+                point = view.sel()[0].begin()
+                view.insert_text(point, ' ')
+                prefix = ''
+            character = rng.choice(letters)
+            for r in reversed(view.sel()):
+                view.insert_text(r.begin(), character)
+            prefix += character
+            locations = [r.begin() for r in view.sel()]
+
+            start = time.perf_counter()
+            result = listener.on_query_completions(view, prefix, locations)
+            latencies.append(time.perf_counter() - start)
+            completion_counts.append(len(result[0]) if result else 0)
+        run_time = time.perf_counter() - run_start
+
+        if options.trace_memory:
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        if options.trace_memory:
+            tracemalloc.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+        commands.plugin_unloaded()
+
+    latencies.sort()
+    lines = [
+        'DynamicCompletions benchmark',
+        '',
+        'words=%s files=%s lines=%s cursors=%s triggers=%s keystrokes=%s '
+        'prefix_index=%s compact=%s process=%s max_completions=%s' % (
+            options.words, options.files, options.lines, options.cursors,
+            options.triggers, options.keystrokes, options.prefix_index,
+            options.compact, options.process, settings.get('max_completions')),
+        '',
+        'Initial load:       %10.2f ms' % (load_time * 1000),
+        'Keystroke p50:      %10.3f ms' % (percentile(latencies, 50) * 1000),
+        'Keystroke p95:      %10.3f ms' % (percentile(latencies, 95) * 1000),
+        'Keystroke p99:      %10.3f ms' % (percentile(latencies, 99) * 1000),
+        'Keystroke max:      %10.3f ms' % (latencies[-1] * 1000),
+        'Throughput:         %10.1f keystrokes/s' % (options.keystrokes / run_time),
+        'Mean completions:   %10.1f' % (sum(completion_counts) /
+                                        float(len(completion_counts))),
+    ]
+    if options.trace_memory:
+        lines.extend([
+            'Peak Python memory: %10.2f MB' % (peak_memory / 1048576.0),
+            'Final Python memory:%10.2f MB' % (current_memory / 1048576.0),
+        ])
+    elif resource is not None:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != 'darwin':
+            peak_rss *= 1024
+        lines.append('Peak process RSS:   %10.2f MB' % (peak_rss / 1048576.0))
+    if options.stats:
+        stats = importlib.import_module(PACKAGE_NAME + '.src.stats')
+        lines.extend(['', stats.report()])
+    return '\n'.join(lines) + '\n'
+
+
+def parse_args(args = None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark DynamicCompletions outside of Sublime Text.')
+    parser.add_argument('--words', type=int, default=50000,
+                        help='completions in the static, file and path loaders')
+    parser.add_argument('--vocabulary', type=int, default=0,
+                        help='draw every word from a shared vocabulary of '
+                             'this size instead of generating random words')
+    parser.add_argument('--files', type=int, default=200,
+                        help='files read by the path loader')
+    parser.add_argument('--lines', type=int, default=10000,
+                        help='lines in the view')
+    parser.add_argument('--cursors', type=int, default=1,
+                        help='cursors in the view')
+    parser.add_argument('--triggers', type=int, default=20,
+                        help='registered triggers')
+    parser.add_argument('--keystrokes', type=int, default=500,
+                        help='keystrokes to simulate')
+    parser.add_argument('--word-length', type=int, default=6,
+                        help='keystrokes typed before starting a new word')
+    parser.add_argument('--prefix-index', action='store_true',
+                        help='enable PrefixIndexed on the loaders')
+    parser.add_argument('--compact', action='store_true',
+                        help='enable CompactCompletions on the loaders')
+    parser.add_argument('--process', action='store_true',
+                        help='parse the file and path loaders in worker '
+                             'processes (LoadInProcess)')
+    parser.add_argument('--max-completions', type=int,
+                        help='override the max_completions setting')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed for the random corpus')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='trace Python allocations to report peak memory '
+                             '(slows down the keystroke timings)')
+    parser.add_argument('--stats', action='store_true',
+                        help='include the per-stage statistics')
+    parser.add_argument('--output',
+                        help='also write the report to this file')
+    return parser.parse_args(args)
+
+
+def main(args = None):
+    options = parse_args(args)
+    report = run(options)
+    sys.stdout.write(report)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""A minimal stand-in for the sublime module used by the benchmarks.
+
+Only the parts of the API used by DynamicCompletions are implemented.
+Callbacks passed to set_timeout run immediately in the calling thread.
+
+"""
+import json
+import os
+import re
+import tempfile
+
+
+INHIBIT_WORD_COMPLETIONS = 8
+INHIBIT_EXPLICIT_COMPLETIONS = 16
+
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+_CACHE_DIR = tempfile.mkdtemp(prefix='dynamic_completions_bench_')
+_settings = dict()
+
+
+def cache_path():
+    return _CACHE_DIR
+
+
+def set_timeout(callback, delay = 0):
+    callback()
+
+
+def set_timeout_async(callback, delay = 0):
+    callback()
+
+
+def load_settings(name):
+    """Return the settings in the package's settings file named name."""
+    try:
+        return _settings[name]
+    except KeyError:
+        pass
+    settings = _settings[name] = Settings()
+    file_path = os.path.join(_PACKAGE_DIR, name)
+    if os.path.exists(file_path):
+        with open(file_path) as f:
+            text = re.sub(r'^\s*//.*$', '', f.read(), flags=re.MULTILINE)
+        settings.update(json.loads(text))
+    return settings
+
+
+def score_selector(scope_name, selector):
+    """Return a score for selector against scope_name.
+
+    Each comma-separated alternative matches if each of its space-separated
+    parts is a prefix of a scope in scope_name, in order. The score is the
+    number of matched parts, which is enough to tell a match from no match.
+
+    """
+    scopes = scope_name.split()
+    best = 0
+    for alternative in selector.split(','):
+        parts = alternative.split()
+        i = 0
+        score = 0
+        for p in parts:
+            while (i < len(scopes)) and not (
+                    (scopes[i] == p) or scopes[i].startswith(p + '.')):
+                i += 1
+            if i == len(scopes):
+                score = 0
+                break
+            score += 1
+            i += 1
+        best = max(best, score)
+    return best
+
+
+class Settings(dict):
+
+    def __init__(self, *args, **kwargs):
+        super(Settings, self).__init__(*args, **kwargs)
+        self.callbacks = dict()
+
+    def get(self, name, default = None):
+        return dict.get(self, name, default)
+
+    def set(self, name, value):
+        self[name] = value
+        for c in list(self.callbacks.values()):
+            c()
+
+    def has(self, name):
+        return name in self
+
+    def add_on_change(self, key, callback):
+        self.callbacks[key] = callback
+
+    def clear_on_change(self, key):
+        self.callbacks.pop(key, None)
+
+
+class Region(object):
+
+    def __init__(self, a, b = None):
+        self.a = a
+        self.b = a if b is None else b
+
+    def __repr__(self):
+        return 'Region(%s, %s)' % (self.a, self.b)
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def size(self):
+        return self.end() - self.begin()
+
+    def empty(self):
+        return self.a == self.b
+
+
+class View(object):
+    """A buffer with selections and a single scope for the whole view."""
+
+    _next_id = 1
+
+    def __init__(self, text = '', scope = 'source.bench', file_name = None):
+        self._id = View._next_id
+        View._next_id += 1
+        self.text = text
+        self.scope = scope
+        self._file_name = file_name
+        self._change_count = 0
+        self._selection = [Region(len(text))]
+        self._settings = Settings()
+        self._valid = True
+
+    def __repr__(self):
+        return 'View(%s)' % self._id
+
+    def id(self):
+        return self._id
+
+    def buffer_id(self):
+        return self._id
+
+    def file_name(self):
+        return self._file_name
+
+    def is_valid(self):
+        return self._valid
+
+    def close(self):
+        self._valid = False
+
+    def window(self):
+        return None
+
+    def settings(self):
+        return self._settings
+
+    def sel(self):
+        return self._selection
+
+    def set_cursors(self, points):
+        self._selection = [Region(p) for p in points]
+
+    def size(self):
+        return len(self.text)
+
+    def substr(self, x):
+        if isinstance(x, Region):
+            return self.text[x.begin():x.end()]
+        return self.text[x:x + 1]
+
+    def change_count(self):
+        return self._change_count
+
+    def scope_name(self, point):
+        return self.scope + ' '
+
+    def score_selector(self, point, selector):
+        return score_selector(self.scope_name(point), selector)
+
+    def insert_text(self, point, text):
+        """Insert text at point, shifting any cursors after it."""
+        self.text = self.text[:point] + text + self.text[point:]
+        self._change_count += 1
+        self._selection = [Region(r.a + len(text)) if r.a >= point else r
+                           for r in self._selection]
+
+    def run_command(self, name, args = None):
+        pass
+
+    def is_auto_complete_visible(self):
+        return False
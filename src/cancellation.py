@@ -0,0 +1,77 @@
+import threading
+
+
+class LoadCancelled(Exception):
+    """Raised inside a load that has been cancelled."""
+    pass
+
+
+class CancellationToken(object):
+    """A flag used to ask a running load to stop.
+
+    The framework creates a token for each load and passes it to
+    load_completions as the cancel_token keyword argument. Long-running
+    loads should call raise_if_cancelled regularly, or check cancelled and
+    return early. The streaming helpers check the token for each record or
+    chunk.
+
+    """
+
+    def __init__(self):
+        super(CancellationToken, self).__init__()
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'CancellationToken(cancelled = %s)' % self.cancelled
+
+    @property
+    def cancelled(self):
+        """True if the token has been cancelled."""
+        return self._event.is_set()
+
+    def cancel(self):
+        """Cancel the token and call its callbacks.
+
+        Cancelling a token more than once has no further effect.
+
+        """
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def raise_if_cancelled(self):
+        """Raise LoadCancelled if the token has been cancelled."""
+        if self._event.is_set():
+            raise LoadCancelled()
+
+    def add_callback(self, callback):
+        """Call callback with no arguments when the token is cancelled.
+
+        If the token is already cancelled, callback is called immediately.
+
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def wait(self, timeout = None):
+        """Wait until the token is cancelled or timeout seconds pass.
+
+        Returns True if the token was cancelled.
+
+        """
+        return self._event.wait(timeout)
+
+
+def raise_if_cancelled(cancel_token):
+    """Raise LoadCancelled if cancel_token is not None and has been cancelled."""
+    if (cancel_token is not None) and cancel_token.cancelled:
+        raise LoadCancelled()
@@ -0,0 +1,72 @@
+import hashlib
+import os
+import pickle
+
+import sublime
+
+try:
+    import sublimelogging
+    logger = sublimelogging.getLogger(__name__)
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+
+"""Incremented whenever the format of the cache files changes."""
+CACHE_VERSION = 1
+
+
+def get_cache_dir():
+    """Return the directory used to store cached completions."""
+    return os.path.join(sublime.cache_path(), 'DynamicCompletions')
+
+
+def get_cache_file(key):
+    """Return the path of the cache file for key."""
+    digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    return os.path.join(get_cache_dir(), digest + '.pickle')
+
+
+def read(key):
+    """Return the data cached for key, or None if there is none.
+
+    Cache files that cannot be read, were written by a different version or
+    were written for a different key are ignored.
+
+    """
+    file_path = get_cache_file(key)
+    try:
+        with open(file_path, 'rb') as f:
+            version, cached_key, data = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning('Ignoring unreadable cache file %s', file_path,
+                       exc_info=True)
+        return None
+    if (version != CACHE_VERSION) or (cached_key != key):
+        return None
+    return data
+
+
+def write(key, data):
+    """Cache data for key.
+
+    The data is written to a temporary file first so that a partially
+    written file is never read.
+
+    """
+    file_path = get_cache_file(key)
+    temp_path = '%s.%s.tmp' % (file_path, os.getpid())
+    try:
+        os.makedirs(get_cache_dir(), exist_ok=True)
+        with open(temp_path, 'wb') as f:
+            pickle.dump((CACHE_VERSION, key, data), f,
+                        pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, file_path)
+    except Exception:
+        logger.exception('Failed to write cache file %s', file_path)
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
@@ -0,0 +1,102 @@
+import threading
+
+try:
+    import asyncio
+except ImportError:
+    # asyncio is not available in Sublime Text 3's Python 3.3
+    asyncio = None
+
+try:
+    import sublimelogging
+    logger = sublimelogging.getLogger(__name__)
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+
+_loop = None
+_thread = None
+_loop_lock = threading.Lock()
+
+
+def is_coroutine_function(fn):
+    """Return True if fn was defined with async def."""
+    if asyncio is None:
+        return False
+    return asyncio.iscoroutinefunction(fn)
+
+
+def get_event_loop():
+    """Return the shared background event loop, starting it if needed.
+
+    The loop runs forever in a single daemon thread, so any number of
+    coroutines can wait on I/O without each needing a thread of their own.
+
+    """
+    global _loop, _thread
+    if asyncio is None:
+        raise RuntimeError('asyncio is not available')
+    with _loop_lock:
+        if _loop is None:
+            logger.debug('Starting background event loop')
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_run_loop, args=(_loop,),
+                                       name='DynamicCompletions event loop')
+            _thread.daemon = True
+            _thread.start()
+        return _loop
+
+
+def _run_loop(loop):
+    """Run loop in the current thread until it is stopped, then close it.
+
+    Coroutines that are still running when the loop stops are cancelled and
+    given a chance to clean up before the loop is closed.
+
+    """
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_forever()
+        tasks = _all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            loop.run_until_complete(
+                asyncio.gather(*tasks, return_exceptions=True))
+    finally:
+        loop.close()
+
+
+def _all_tasks(loop):
+    """Return the unfinished tasks of loop."""
+    try:
+        all_tasks = asyncio.all_tasks
+    except AttributeError:
+        # asyncio.all_tasks was added in Python 3.7
+        all_tasks = asyncio.Task.all_tasks
+    return [t for t in all_tasks(loop) if not t.done()]
+
+
+def run_coroutine(coro):
+    """Schedule coro on the shared event loop and return a Future.
+
+    The returned concurrent.futures.Future can be waited on from any thread,
+    and cancelling it cancels the coroutine.
+
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def shutdown_event_loop():
+    """Stop the shared event loop.
+
+    Coroutines that are still running are cancelled. A new loop is started
+    the next time one is needed.
+
+    """
+    global _loop, _thread
+    with _loop_lock:
+        loop, _loop = _loop, None
+        _thread = None
+    if loop is not None:
+        loop.call_soon_threadsafe(loop.stop)
@@ -0,0 +1,226 @@
+from concurrent.futures import (CancelledError, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import pickle
+import threading
+
+from .cancellation import LoadCancelled
+from .settings import get_setting
+
+try:
+    import sublimelogging
+    logger = sublimelogging.getLogger(__name__)
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+
+DEFAULT_WORKER_COUNT = 4
+DEFAULT_PROCESS_COUNT = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_process_executor = None
+_process_executor_lock = threading.Lock()
+
+# Set when the process pool fails to start or breaks, so later loads fall
+# back to threads without trying again.
+_process_pool_failed = False
+
+
+def get_executor():
+    """Return the shared executor, creating it if needed.
+
+    The executor lives for the whole plugin. The number of workers is read
+    from the worker_count setting when the executor is created.
+
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = get_setting('worker_count', DEFAULT_WORKER_COUNT)
+            try:
+                workers = max(1, int(workers))
+            except (TypeError, ValueError):
+                logger.warning('Invalid worker_count setting: %s', workers)
+                workers = DEFAULT_WORKER_COUNT
+            logger.debug('Starting executor with %s workers', workers)
+            _executor = ThreadPoolExecutor(max_workers=workers)
+        return _executor
+
+
+def submit(fn, *args, **kwargs):
+    """Submit fn to the shared executor and return a Future.
+
+    Exceptions raised by fn are logged when the Future completes.
+
+    """
+    future = get_executor().submit(fn, *args, **kwargs)
+    future.add_done_callback(_log_exception)
+    return future
+
+
+def get_process_executor():
+    """Return the shared process pool, creating it if needed.
+
+    None is returned if the process_workers setting is 0 or the pool could
+    not be used. The start method and the Python executable used for new
+    processes can be set with the process_start_method and
+    process_python_executable settings. Sublime Text's plugin host cannot
+    start a process pool on every platform, so callers must be prepared to
+    do the work in the current process instead.
+
+    """
+    global _process_executor
+    with _process_executor_lock:
+        if _process_pool_failed:
+            return None
+        if _process_executor is None:
+            workers = get_setting('process_workers', DEFAULT_PROCESS_COUNT)
+            try:
+                workers = max(0, int(workers))
+            except (TypeError, ValueError):
+                logger.warning('Invalid process_workers setting: %s', workers)
+                workers = DEFAULT_PROCESS_COUNT
+            if workers == 0:
+                return None
+            logger.debug('Starting process pool with %s workers', workers)
+            try:
+                _process_executor = _create_process_executor(workers)
+            except Exception:
+                logger.exception('Unable to start the process pool')
+                _disable_process_pool()
+        return _process_executor
+
+
+def _create_process_executor(workers):
+    """Return a ProcessPoolExecutor using the configured start method."""
+    context = multiprocessing.get_context(
+        get_setting('process_start_method', None))
+    python = get_setting('process_python_executable', None)
+    if python:
+        context.set_executable(python)
+    try:
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    except TypeError:
+        # mp_context is not supported before Python 3.7
+        return ProcessPoolExecutor(max_workers=workers)
+
+
+def run_in_process(fn, *args, **kwargs):
+    """Call fn(*args) in the shared process pool and return the result.
+
+    Blocks until the result is available. Raises ProcessPoolUnavailable under
+    the same conditions as submit_to_process and process_result. A
+    cancel_token keyword argument is passed to process_result.
+
+    """
+    return process_result(submit_to_process(fn, *args),
+                          kwargs.get('cancel_token'))
+
+
+def submit_to_process(fn, *args):
+    """Submit fn(*args) to the shared process pool and return a Future.
+
+    fn and args must be picklable, so fn must be a module-level function.
+    ProcessPoolUnavailable is raised if fn or args cannot be pickled, or if
+    the process pool is disabled or cannot be started. A pool that fails is
+    not used again until the plugin is reloaded.
+
+    """
+    process_executor = get_process_executor()
+    if process_executor is None:
+        raise ProcessPoolUnavailable('The process pool is not available')
+    try:
+        pickle.dumps((fn, args))
+    except Exception as e:
+        logger.warning('Unable to send %r to the process pool: %s', fn, e)
+        raise ProcessPoolUnavailable(str(e))
+    try:
+        # Worker processes are started on submit, so an error here means
+        # they could not be started
+        return process_executor.submit(fn, *args)
+    except (BrokenProcessPool, OSError, RuntimeError) as e:
+        _process_pool_broken(e)
+
+
+def process_result(future, cancel_token = None):
+    """Return the result of a Future from submit_to_process.
+
+    Exceptions raised by the function are raised by this function. If the
+    process pool broke before the function finished, ProcessPoolUnavailable
+    is raised instead. If cancel_token is cancelled while waiting, the
+    Future is cancelled and LoadCancelled is raised. A worker process that
+    has already started the function finishes it, but its result is
+    discarded.
+
+    """
+    if cancel_token is not None:
+        # Wake up when either the Future finishes or the token is cancelled
+        wake = threading.Event()
+        future.add_done_callback(lambda f: wake.set())
+        cancel_token.add_callback(wake.set)
+        wake.wait()
+        if cancel_token.cancelled:
+            future.cancel()
+            raise LoadCancelled()
+    try:
+        return future.result()
+    except CancelledError:
+        raise LoadCancelled()
+    except BrokenProcessPool as e:
+        _process_pool_broken(e)
+
+
+def _process_pool_broken(exc):
+    """Stop using a process pool that failed and raise ProcessPoolUnavailable."""
+    logger.warning('Process pool failed, loading in threads: %s', exc)
+    with _process_executor_lock:
+        _disable_process_pool()
+    raise ProcessPoolUnavailable(str(exc))
+
+
+def _disable_process_pool():
+    """Stop using the process pool until it is shut down."""
+    global _process_executor, _process_pool_failed
+    _process_pool_failed = True
+    process_executor, _process_executor = _process_executor, None
+    if process_executor is not None:
+        process_executor.shutdown(wait=False)
+
+
+class ProcessPoolUnavailable(Exception):
+    """Raised when the shared process pool cannot be used."""
+    pass
+
+
+def shutdown_executor(wait = False):
+    """Shut down the shared executor and the shared process pool.
+
+    A new executor is created the next time one is needed.
+
+    """
+    global _executor, _process_executor, _process_pool_failed
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+    with _process_executor_lock:
+        process_executor, _process_executor = _process_executor, None
+        _process_pool_failed = False
+    if process_executor is not None:
+        process_executor.shutdown(wait=wait)
+
+
+def _log_exception(future):
+    """Log any exception raised by the callable of a completed Future."""
+    if future.cancelled():
+        return
+    exc = future.exception()
+    if isinstance(exc, LoadCancelled):
+        logger.debug('Background task cancelled')
+    elif exc is not None:
+        logger.error('Unhandled exception in background task',
+                     exc_info=(type(exc), exc, exc.__traceback__))
@@ -0,0 +1,86 @@
+import sys
+import threading
+
+from .ranking import SortedCompletions
+
+
+# Process-wide pool of interned completion tuples. Each tuple is stored as
+# both the key and the value.
+_pool = dict()
+_lock = threading.Lock()
+
+# The size of the pool after it was last pruned.
+_pruned_size = 0
+
+"""The pool is pruned once it grows by this many entries since the last prune."""
+PRUNE_THRESHOLD = 65536
+
+
+def intern_completion(completion):
+    """Return a shared copy of completion.
+
+    Strings are interned with sys.intern. Sequences are converted to tuples
+    of interned strings and pooled, so equal completions loaded by different
+    loaders share a single object.
+
+    """
+    if isinstance(completion, str):
+        return sys.intern(completion)
+    completion = tuple(sys.intern(c) if isinstance(c, str) else c
+                       for c in completion)
+    try:
+        return _pool[completion]
+    except KeyError:
+        with _lock:
+            return _pool.setdefault(completion, completion)
+
+
+def intern_completions(completions):
+    """Return an iterator of the interned copies of completions."""
+    return map(intern_completion, completions)
+
+
+def compact_completions(completions):
+    """Return a compact, immutable copy of a collection of completions.
+
+    A flat collection becomes a SortedCompletions of interned completions. A
+    dict becomes a dict of SortedCompletions keyed by completion type.
+
+    """
+    try:
+        if isinstance(completions, dict):
+            return dict((sys.intern(t) if isinstance(t, str) else t,
+                         SortedCompletions.from_iterable(list(intern_completions(c))))
+                        for t, c in completions.items())
+        return SortedCompletions.from_iterable(
+            list(intern_completions(completions)))
+    finally:
+        maybe_prune()
+
+
+def pool_size():
+    """Return the number of completion tuples in the pool."""
+    return len(_pool)
+
+
+def maybe_prune():
+    """Prune the pool if it has grown significantly since it was last pruned."""
+    if len(_pool) - _pruned_size > PRUNE_THRESHOLD:
+        prune()
+
+
+def prune():
+    """Remove the completions from the pool that are no longer used elsewhere.
+
+    A pooled tuple is referenced twice by the pool, as the key and the value,
+    and once by the argument to sys.getrefcount. Any tuple with no other
+    references is removed.
+
+    """
+    global _pruned_size
+    with _lock:
+        unused = [c for c in _pool if sys.getrefcount(_pool[c]) <= 4]
+        for c in unused:
+            del _pool[c]
+        _pruned_size = len(_pool)
+    return len(unused)
@@ -0,0 +1,131 @@
+import collections
+import threading
+import time
+
+
+class LRUCache(object):
+    """A dict-like cache that evicts its least recently used entries.
+
+    Keyword arguments:
+    limits - A function returning a tuple of (max_entries, ttl). max_entries
+             is the maximum number of entries to keep and ttl is the number
+             of seconds an entry can go unused before it is evicted. Either
+             can be 0 to disable that limit. The function is called whenever
+             an entry is added, so limits can follow changing settings.
+    on_evict - A function called with (key, value) for each evicted entry.
+
+    Reading an entry with [] or get, or calling touch, marks it as recently
+    used.
+
+    """
+
+    def __init__(self, limits = None, on_evict = None):
+        super(LRUCache, self).__init__()
+        self.limits = limits
+        self.on_evict = on_evict
+        self.entries = collections.OrderedDict()
+        self.access_times = dict()
+        self.max_entries = 0
+        self.ttl = 0
+        self.lock = threading.RLock()
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, dict(self.entries))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(list(self.entries))
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __getitem__(self, key):
+        with self.lock:
+            value = self.entries[key]
+            self.entries.move_to_end(key)
+            self.access_times[key] = time.time()
+            self.evict_expired()
+        return value
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            self.access_times[key] = time.time()
+            self.update_limits()
+            self.evict_expired()
+            self.evict_overflow()
+
+    def __delitem__(self, key):
+        with self.lock:
+            del self.entries[key]
+            del self.access_times[key]
+
+    def touch(self, key):
+        """Mark key as recently used without evicting anything.
+
+        Nothing happens if key is not in the cache.
+
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.access_times[key] = time.time()
+
+    def get(self, key, default = None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, *default):
+        with self.lock:
+            self.access_times.pop(key, None)
+            return self.entries.pop(key, *default)
+
+    def keys(self):
+        return list(self.entries.keys())
+
+    def values(self):
+        return list(self.entries.values())
+
+    def items(self):
+        return list(self.entries.items())
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.access_times.clear()
+
+    def update_limits(self):
+        """Read the current limits from the limits function."""
+        if self.limits is not None:
+            self.max_entries, self.ttl = self.limits()
+
+    def evict_expired(self):
+        """Evict the entries that have not been used within the ttl."""
+        if not self.ttl:
+            return
+        cutoff = time.time() - self.ttl
+        # Entries are in order of use, so only the oldest need checking
+        while self.entries:
+            key = next(iter(self.entries))
+            if self.access_times[key] > cutoff:
+                break
+            self.evict(key)
+
+    def evict_overflow(self):
+        """Evict the least recently used entries over max_entries."""
+        if not self.max_entries:
+            return
+        while len(self.entries) > self.max_entries:
+            self.evict(next(iter(self.entries)))
+
+    def evict(self, key):
+        """Remove key and pass it to the on_evict function."""
+        value = self.entries.pop(key)
+        del self.access_times[key]
+        if self.on_evict is not None:
+            self.on_evict(key, value)
@@ -0,0 +1,103 @@
+import collections
+
+
+class CompletionCounter(object):
+    """Counts the sources that contribute each completion.
+
+    This is used by loaders that patch their completions incrementally. A
+    completion stays in self.completions until every source that contributed
+    it has been removed.
+
+    """
+
+    def __init__(self):
+        super(CompletionCounter, self).__init__()
+        self.counts = collections.Counter()
+        self.completions = set()
+
+    def __len__(self):
+        return len(self.completions)
+
+    def add(self, completions):
+        """Add one contribution for each completion.
+
+        Returns a list of the completions that were not present before.
+
+        """
+        added = []
+        counts = self.counts
+        for c in completions:
+            n = counts[c]
+            counts[c] = n + 1
+            if n == 0:
+                self.completions.add(c)
+                added.append(c)
+        return added
+
+    def remove(self, completions):
+        """Remove one contribution for each completion.
+
+        Returns a list of the completions that are no longer present.
+
+        """
+        removed = []
+        counts = self.counts
+        for c in completions:
+            n = counts[c] - 1
+            if n > 0:
+                counts[c] = n
+            else:
+                del counts[c]
+                self.completions.discard(c)
+                removed.append(c)
+        return removed
+
+
+class TypedCompletionCounter(object):
+    """Counts the sources that contribute each completion, per completion type.
+
+    Contributions are dicts of completions keyed by completion type.
+    self.completions is a dict of sets keyed by completion type.
+
+    """
+
+    def __init__(self):
+        super(TypedCompletionCounter, self).__init__()
+        self.counters = dict()
+        self.completions = dict()
+
+    def __len__(self):
+        return sum(len(c) for c in self.completions.values())
+
+    def add(self, completions):
+        """Add one contribution for each completion of each type.
+
+        Returns a dict of lists of the completions that were not present
+        before, keyed by completion type.
+
+        """
+        added = dict()
+        for t, c in completions.items():
+            try:
+                counter = self.counters[t]
+            except KeyError:
+                counter = self.counters[t] = CompletionCounter()
+                self.completions[t] = counter.completions
+            added[t] = counter.add(c)
+        return added
+
+    def remove(self, completions):
+        """Remove one contribution for each completion of each type.
+
+        Returns a dict of lists of the completions that are no longer
+        present, keyed by completion type.
+
+        """
+        removed = dict()
+        for t, c in completions.items():
+            try:
+                counter = self.counters[t]
+            except KeyError:
+                continue
+            removed[t] = counter.remove(c)
+        return removed
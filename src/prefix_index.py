@@ -0,0 +1,79 @@
+from bisect import bisect_left, bisect_right
+
+
+def completion_trigger(completion):
+    """Return the trigger text of a completion.
+
+    A completion is either a string or a sequence of (trigger, contents). Any
+    annotation following a tab in the trigger is removed.
+
+    """
+    if isinstance(completion, str):
+        trigger = completion
+    else:
+        trigger = completion[0]
+    return trigger.split('\t', 1)[0]
+
+
+def index_key(completion):
+    """Return the key used to order a completion within a PrefixIndex."""
+    return completion_trigger(completion).lower()
+
+
+class PrefixIndex(object):
+    """A sorted array of completions that can be searched by prefix.
+
+    The index is built once from a collection of completions. Searching uses
+    bisect on the lowercased triggers, so each search costs O(log n) plus the
+    size of the result.
+
+    """
+
+    def __init__(self, completions):
+        super(PrefixIndex, self).__init__()
+        self.completions = sorted(completions, key=index_key)
+        self.keys = [index_key(c) for c in self.completions]
+
+    def __len__(self):
+        return len(self.completions)
+
+    def __iter__(self):
+        return iter(self.completions)
+
+    def search(self, prefix):
+        """Return a list of the completions whose trigger starts with prefix.
+
+        Matching is case-insensitive. An empty prefix returns every
+        completion in the index.
+
+        """
+        if not prefix:
+            return list(self.completions)
+        prefix = prefix.lower()
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix[:-1] + chr(ord(prefix[-1]) + 1),
+                          start)
+        return self.completions[start:end]
+
+    def add(self, completion):
+        """Insert completion into the index, keeping it sorted."""
+        key = index_key(completion)
+        i = bisect_right(self.keys, key)
+        self.keys.insert(i, key)
+        self.completions.insert(i, completion)
+
+    def remove(self, completion):
+        """Remove completion from the index.
+
+        A ValueError is raised if completion is not in the index.
+
+        """
+        key = index_key(completion)
+        i = bisect_left(self.keys, key)
+        while (i < len(self.keys)) and (self.keys[i] == key):
+            if self.completions[i] == completion:
+                del self.keys[i]
+                del self.completions[i]
+                return
+            i += 1
+        raise ValueError('%r is not in the index' % (completion,))
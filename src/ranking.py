@@ -0,0 +1,256 @@
+from bisect import bisect_left
+import collections
+import heapq
+from itertools import chain, groupby, repeat
+from operator import itemgetter
+
+from .prefix_index import completion_trigger
+
+
+"""The completions returned by a loader along with the loader's priority."""
+CompletionResult = collections.namedtuple('CompletionResult',
+                                          ['completions', 'flags', 'priority'])
+
+
+def is_flagged_result(result):
+    """Return True if result is a (completions, flags) tuple.
+
+    A SortedCompletions is a tuple of completions, not a (completions, flags)
+    tuple.
+
+    """
+    return isinstance(result, tuple) and not isinstance(result, SortedCompletions)
+
+
+def merge_key(completion):
+    """Return the trigger used to sort and deduplicate a completion."""
+    if isinstance(completion, str):
+        return completion
+    return completion[0]
+
+
+class SortedCompletions(tuple):
+    """An immutable collection of completions sorted by merge_key.
+
+    Loaders can return this from filter_completions to tell the collector
+    that their completions are already sorted and deduplicated.
+
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_iterable(cls, completions):
+        """Return a SortedCompletions of the unique triggers in completions."""
+        if isinstance(completions, cls):
+            return completions
+        if iter(completions) is completions:
+            # An iterator can only be read once
+            completions = list(completions)
+        unique = dict(zip(map(merge_key, completions), completions))
+        return cls(unique[k] for k in sorted(unique))
+
+    @classmethod
+    def merge(cls, partitions):
+        """Return a SortedCompletions of the unique triggers in partitions.
+
+        partitions is a list of SortedCompletions. Since each is already
+        sorted, the sort only has to merge their runs. If several partitions
+        have the same trigger, the completion from the first is kept.
+
+        """
+        merged = sorted(chain.from_iterable(partitions), key=merge_key)
+        return cls(next(g) for k, g in groupby(merged, key=merge_key))
+
+    def patch(self, source, added, removed):
+        """Return a copy with completions added and removed, or None.
+
+        Keyword arguments:
+        source - The collection of completions this was built from, after
+                 the changes. A completion is only added if it is in source
+                 and only removed if it is not, so a completion that is in
+                 both added and removed is handled correctly.
+        added - An iterable of the completions added to source
+        removed - An iterable of the completions removed from source
+
+        Each change is located by bisecting on the trigger, so a few changes
+        cost much less than sorting source again. None is returned if a
+        change would replace a completion with a different completion that
+        has the same trigger; rebuild from source with from_iterable instead.
+
+        """
+        patched = list(self)
+        triggers = _Triggers(patched)
+        for c in removed:
+            if c in source:
+                continue
+            key = merge_key(c)
+            i = bisect_left(triggers, key)
+            if (i < len(patched)) and (merge_key(patched[i]) == key):
+                if patched[i] != c:
+                    return None
+                del patched[i]
+        for c in added:
+            if c not in source:
+                continue
+            key = merge_key(c)
+            i = bisect_left(triggers, key)
+            if (i < len(patched)) and (merge_key(patched[i]) == key):
+                if patched[i] != c:
+                    return None
+            else:
+                patched.insert(i, c)
+        return self.__class__(patched)
+
+
+class _Triggers(object):
+    """A read-only sequence of the triggers of a sorted list of completions.
+
+    Used to bisect the list by trigger without building a list of keys.
+
+    """
+
+    __slots__ = ('completions',)
+
+    def __init__(self, completions):
+        self.completions = completions
+
+    def __len__(self):
+        return len(self.completions)
+
+    def __getitem__(self, i):
+        return merge_key(self.completions[i])
+
+
+def deduplicate(results):
+    """Return a dict of (completion, priority) tuples keyed by merge_key.
+
+    Keyword arguments:
+    results - An iterable of (completions, priority) tuples
+
+    When several loaders return the same trigger, the completion from the
+    loader with the highest priority is kept.
+
+    """
+    unique = dict()
+    # Add the highest priority completions last so that they are kept
+    for completions, priority in sorted(results, key=lambda r: r[1]):
+        unique.update(zip(map(merge_key, completions),
+                          zip(completions, repeat(priority))))
+    return unique
+
+
+def merge_results(results):
+    """Return a sorted list of completions with duplicate triggers removed.
+
+    Keyword arguments:
+    results - An iterable of (completions, priority) tuples
+
+    When several loaders return the same trigger, the completion from the
+    loader with the highest priority is kept. Sorted results are added in
+    order, so the final sort merges already sorted runs rather than sorting
+    the whole collection from scratch.
+
+    """
+    results = [r for r in results if r[0]]
+    if not results:
+        return []
+    elif (len(results) == 1) and isinstance(results[0][0], SortedCompletions):
+        return list(results[0][0])
+
+    # If every completion is a string, the completion is its own trigger, so
+    # the runs can be merged by a single sort and deduplicated in order.
+    if all(set(map(type, c)) == {str} for c, priority in results):
+        merged = []
+        for c, priority in results:
+            merged.extend(c)
+        merged.sort()
+        return [c for c, group in groupby(merged)]
+
+    unique = dict()
+    # Add the highest priority completions last so that they are kept
+    for completions, priority in sorted(results, key=lambda r: r[1]):
+        unique.update(zip(map(merge_key, completions), completions))
+    return [unique[k] for k in sorted(unique)]
+
+
+def is_subsequence(text, other):
+    """Return True if the characters of text appear in order in other."""
+    remaining = iter(other)
+    return all(c in remaining for c in text)
+
+
+def default_scorer(completion, prefix, priority):
+    """Return a sortable score for a completion, or None if it does not match.
+
+    Completions whose trigger starts with prefix rank above case-insensitive
+    prefix matches, which rank above fuzzy (subsequence) matches. Ties are
+    broken by the priority of the loader and then by preferring shorter
+    triggers.
+
+    """
+    trigger = completion_trigger(completion)
+    if not prefix:
+        match = 1
+    elif trigger.startswith(prefix):
+        match = 4
+    else:
+        lower_trigger = trigger.lower()
+        lower_prefix = prefix.lower()
+        if lower_trigger.startswith(lower_prefix):
+            match = 3
+        elif is_subsequence(lower_prefix, lower_trigger):
+            match = 2
+        else:
+            return None
+    return (match, priority, -len(trigger))
+
+
+_scorer = default_scorer
+
+
+def get_scorer():
+    """Return the function used to score completions."""
+    return _scorer
+
+
+def set_scorer(scorer):
+    """Set the function used to score completions.
+
+    scorer is called with (completion, prefix, priority) and should return a
+    sortable score, where higher scores rank first, or None to leave the
+    completion out. Pass None to restore default_scorer.
+
+    """
+    global _scorer
+    _scorer = scorer or default_scorer
+
+
+def top_k(results, prefix, k, scorer = None):
+    """Return a list of the k best unique completions, best first.
+
+    Keyword arguments:
+    results - An iterable of (completions, priority) tuples
+    prefix - The text that has been typed
+    k - The maximum number of completions to return
+    scorer - The function used to score completions. Defaults to the scorer
+             set with set_scorer.
+
+    The completions are selected with a heap, so the cost is O(n log k)
+    rather than the cost of sorting every completion.
+
+    """
+    if scorer is None:
+        scorer = _scorer
+
+    unique = deduplicate(results)
+
+    def scored():
+        for c, priority in unique.values():
+            score = scorer(c, prefix, priority)
+            if score is not None:
+                yield (score, c)
+
+    # Only the scores are compared, so ties keep the order of the results
+    # and no completions are sorted or compared
+    return [c for score, c in heapq.nlargest(k, scored(), key=itemgetter(0))]
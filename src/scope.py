@@ -0,0 +1,84 @@
+import threading
+
+import sublime
+
+
+"""The maximum number of entries kept in each cache before it is cleared."""
+MAX_CACHE_SIZE = 10000
+
+# Scores keyed by (scope name, selector).
+_scores = dict()
+
+# Scope names keyed by view ID. Each value is a tuple of
+# (change_count, dict of scope names keyed by point).
+_scope_names = dict()
+
+_lock = threading.Lock()
+
+
+def score_scope(scope_name, selector):
+    """Return the score of selector against scope_name.
+
+    Scores are cached by (scope_name, selector). Scope names repeat heavily
+    across a buffer, so most scores are computed once.
+
+    """
+    key = (scope_name, selector)
+    try:
+        return _scores[key]
+    except KeyError:
+        pass
+    score = sublime.score_selector(scope_name, selector)
+    with _lock:
+        if len(_scores) >= MAX_CACHE_SIZE:
+            _scores.clear()
+        _scores[key] = score
+    return score
+
+
+def scope_names(view, points):
+    """Return a list of the scope names at points in view.
+
+    Scope names are cached per view until the view's change count changes.
+
+    """
+    view_id = view.id()
+    change_count = view.change_count()
+    with _lock:
+        try:
+            cached_count, names = _scope_names[view_id]
+        except KeyError:
+            cached_count, names = None, None
+        if cached_count != change_count:
+            if len(_scope_names) >= MAX_CACHE_SIZE:
+                _scope_names.clear()
+            names = dict()
+            _scope_names[view_id] = (change_count, names)
+        elif len(names) >= MAX_CACHE_SIZE:
+            names.clear()
+
+    result = []
+    for p in points:
+        try:
+            name = names[p]
+        except KeyError:
+            name = names[p] = view.scope_name(p)
+        result.append(name)
+    return result
+
+
+def max_score(view, points, selector):
+    """Return the maximum score of selector across points in view.
+
+    If points is empty, the score at the start of the view is returned.
+
+    """
+    if not points:
+        points = [0]
+    return max([score_scope(n, selector) for n in scope_names(view, points)])
+
+
+def clear_view(view_id):
+    """Remove the cached scope names for a view."""
+    with _lock:
+        _scope_names.pop(view_id, None)
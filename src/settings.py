@@ -0,0 +1,13 @@
+import sublime
+
+SETTINGS_FILE = 'DynamicCompletions.sublime-settings'
+
+
+def get_settings():
+    """Return the sublime.Settings object for DynamicCompletions."""
+    return sublime.load_settings(SETTINGS_FILE)
+
+
+def get_setting(name, default = None):
+    """Return the value of a DynamicCompletions setting."""
+    return get_settings().get(name, default)
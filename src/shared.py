@@ -14,20 +14,29 @@ class MiniPluginMeta(ABCMeta):
        additional registering needs to be done, the method can be overridden,
        but you should always call the parent's register method.
     4. A list of the non_abstract child classes can be obtained using the 
-       get_plugins method.
+       get_plugins method. An index of the registered classes for each base
+       class is kept up to date by register and unregister, so get_plugins
+       does not need to inspect the registered classes.
+    5. A generation number is incremented whenever a class is registered or
+       unregistered. It can be compared to a stored value to check if the
+       registered plugins have changed.
 
     """
 
     def __init__(cls, classname, bases, dictionary):
         """Instantiates a MiniPlugin class.
 
-        Creates the Plugins list if this is the base MiniPlugin class.
-        Registers this class if it is not abstract.
+        Creates the Plugins list, the plugin index and the generation number
+        if this is the base MiniPlugin class. Registers this class if it is
+        not abstract.
 
         """
         super(MiniPluginMeta, cls).__init__(classname, bases, dictionary)
         if not [c for c in bases if isinstance(c, MiniPluginMeta)]:
             cls.Plugins = []
+            cls.PluginIndex = dict()
+            cls.PluginRoot = cls
+            cls.Generation = 0
         if not inspect.isabstract(cls):
             cls.register()
     
@@ -53,6 +62,9 @@ class MiniPluginMeta(ABCMeta):
 
         """
         cls.Plugins.append(cls)
+        for c in cls.plugin_bases():
+            cls.PluginIndex.setdefault(c, []).append(cls)
+        cls.PluginRoot.Generation += 1
 
     def unregister(cls):
         """Unregister the current class with it's parent.
@@ -62,10 +74,29 @@ class MiniPluginMeta(ABCMeta):
 
         """
         cls.Plugins.remove(cls)
+        for c in cls.plugin_bases():
+            try:
+                cls.PluginIndex[c].remove(cls)
+            except (KeyError, ValueError):
+                pass
+        cls.PluginRoot.Generation += 1
+
+    def plugin_bases(cls):
+        """Return a list of the classes in the mro that are MiniPlugin classes."""
+        return [c for c in inspect.getmro(cls) if isinstance(c, MiniPluginMeta)]
 
     def get_plugins(cls):
         """Return a list of plugins of the same type."""
-        return [c for c in cls.Plugins if cls in inspect.getmro(c)]
+        return list(cls.PluginIndex.get(cls, ()))
+
+    def get_generation(cls):
+        """Return the generation number of the registered plugins.
+
+        The number is incremented whenever a plugin is registered or
+        unregistered.
+
+        """
+        return cls.PluginRoot.Generation
 
     def get_defined_classes(cls, globals_):
         """Return a list of classes defined in the current file that are instances of the given class.
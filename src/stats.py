@@ -0,0 +1,109 @@
+import collections
+from contextlib import contextmanager
+import threading
+import time
+
+
+"""The number of samples kept for each timer."""
+SAMPLE_COUNT = 1000
+
+_timers = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+class Timer(object):
+    """A rolling window of latency samples for one stage.
+
+    Only the most recent SAMPLE_COUNT samples are kept, so percentiles
+    reflect recent behavior.
+
+    """
+
+    def __init__(self):
+        super(Timer, self).__init__()
+        self.samples = collections.deque(maxlen=SAMPLE_COUNT)
+        self.completion_counts = collections.deque(maxlen=SAMPLE_COUNT)
+        self.count = 0
+
+    def add(self, seconds, completions = None):
+        """Add a sample and, optionally, the number of completions returned."""
+        self.samples.append(seconds)
+        if completions is not None:
+            self.completion_counts.append(completions)
+        self.count += 1
+
+    def percentile(self, percent):
+        """Return the given percentile of the samples in seconds."""
+        samples = sorted(self.samples)
+        if not samples:
+            return 0.0
+        i = int(round((percent / 100.0) * (len(samples) - 1)))
+        return samples[i]
+
+    def mean_completions(self):
+        """Return the mean number of completions, or None if not recorded."""
+        counts = list(self.completion_counts)
+        if not counts:
+            return None
+        return sum(counts) / float(len(counts))
+
+
+def record(stage, name, seconds, completions = None):
+    """Record a sample for stage.
+
+    Keyword arguments:
+    stage - The stage being timed, such as "load_completions"
+    name - The name of the loader or trigger, or None for overall stages
+    seconds - The time the stage took
+    completions - The number of completions returned by the stage
+
+    """
+    key = (stage, name)
+    with _lock:
+        try:
+            timer = _timers[key]
+        except KeyError:
+            timer = _timers[key] = Timer()
+        timer.add(seconds, completions)
+
+
+@contextmanager
+def timed(stage, name = None):
+    """Context manager that records the time spent in its block."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, name, time.perf_counter() - start)
+
+
+def reset():
+    """Remove all recorded samples."""
+    with _lock:
+        _timers.clear()
+
+
+def report():
+    """Return a text table of p50, p95 and p99 latencies for each stage."""
+    with _lock:
+        timers = list(_timers.items())
+    timers.sort(key=lambda t: (t[0][1] is not None, t[0][1] or '', t[0][0]))
+
+    header = ('Stage', 'Loader', 'Count', 'p50 ms', 'p95 ms', 'p99 ms',
+              'Completions')
+    rows = [header]
+    for (stage, name), timer in timers:
+        completions = timer.mean_completions()
+        rows.append((stage,
+                     name or '',
+                     str(timer.count),
+                     '%.2f' % (timer.percentile(50) * 1000),
+                     '%.2f' % (timer.percentile(95) * 1000),
+                     '%.2f' % (timer.percentile(99) * 1000),
+                     '' if completions is None else '%.0f' % completions))
+
+    widths = [max(len(r[i]) for r in rows) for i in range(len(header))]
+    lines = ['  '.join(c.ljust(w) for c, w in zip(r, widths)).rstrip()
+             for r in rows]
+    lines.insert(1, '  '.join('-' * w for w in widths))
+    return '\n'.join(lines) + '\n'
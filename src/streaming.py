@@ -0,0 +1,85 @@
+from .cancellation import raise_if_cancelled
+
+
+"""The default number of bytes in each chunk returned by iter_chunks."""
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+
+"""The number of records read by iter_records between cancellation checks."""
+CANCEL_CHECK_INTERVAL = 1024
+
+
+def iter_records(file_path, separator = b'\n', encoding = 'utf-8',
+                 errors = 'replace', cancel_token = None):
+    """Yield each record in a file, decoded to a string.
+
+    Records are delimited by separator, which is not included. The file is
+    read in blocks of DEFAULT_CHUNK_SIZE bytes, so only the current block and
+    the record being read are held in memory. If cancel_token is cancelled,
+    LoadCancelled is raised.
+
+    The file is read rather than memory-mapped, because accessing a mapping
+    of a file that another process truncates kills the process with SIGBUS.
+
+    """
+    with open(file_path, 'rb') as f:
+        buf = bytearray()
+        count = 0
+        while True:
+            block = f.read(DEFAULT_CHUNK_SIZE)
+            if not block:
+                break
+            # buf holds no separator, so only search where the block starts
+            # (or where a separator split between blocks could start)
+            start = max(0, len(buf) - len(separator) + 1)
+            buf.extend(block)
+            end = buf.rfind(separator, start)
+            if end == -1:
+                continue
+            records = buf[:end].split(separator)
+            del buf[:end + len(separator)]
+            for record in records:
+                count += 1
+                if count % CANCEL_CHECK_INTERVAL == 0:
+                    raise_if_cancelled(cancel_token)
+                yield record.decode(encoding, errors)
+        if buf:
+            yield buf.decode(encoding, errors)
+
+
+def iter_lines(file_path, encoding = 'utf-8', errors = 'replace',
+               cancel_token = None):
+    """Yield each line in a file with the line ending removed."""
+    for line in iter_records(file_path, b'\n', encoding, errors,
+                             cancel_token):
+        if line.endswith('\r'):
+            line = line[:-1]
+        yield line
+
+
+def iter_chunks(file_path, chunk_size = DEFAULT_CHUNK_SIZE,
+                encoding = 'utf-8', errors = 'replace', cancel_token = None):
+    """Yield the contents of a file in chunks of roughly chunk_size bytes.
+
+    Each chunk ends on a line boundary, so no line is split between chunks.
+    A line longer than chunk_size is returned whole. If cancel_token is
+    cancelled, LoadCancelled is raised before the next chunk.
+
+    """
+    with open(file_path, 'rb') as f:
+        buf = bytearray()
+        while True:
+            raise_if_cancelled(cancel_token)
+            block = f.read(chunk_size)
+            if not block:
+                break
+            # buf holds no newline, so only the new block is searched
+            start = len(buf)
+            buf.extend(block)
+            newline = buf.rfind(b'\n', start)
+            if newline == -1:
+                continue
+            yield buf[:newline + 1].decode(encoding, errors)
+            del buf[:newline + 1]
+        if buf:
+            yield buf.decode(encoding, errors)
@@ -0,0 +1,147 @@
+def modified_lines(old_lines, lines):
+    """Return a tuple of (start, old_end, new_end) for the modified lines.
+
+    old_lines[start:old_end] were replaced by lines[start:new_end]. The span
+    is found by skipping the lines that are unchanged at the start and end.
+
+    """
+    limit = min(len(old_lines), len(lines))
+    start = 0
+    while (start < limit) and (old_lines[start] == lines[start]):
+        start += 1
+    old_end = len(old_lines)
+    new_end = len(lines)
+    while ((old_end > start) and (new_end > start) and
+           (old_lines[old_end - 1] == lines[new_end - 1])):
+        old_end -= 1
+        new_end -= 1
+    return (start, old_end, new_end)
+
+
+class IndexedView(object):
+    """The lines of a view and the completions extracted from each line."""
+
+    __slots__ = ('change_count', 'lines', 'line_completions')
+
+    def __init__(self):
+        self.change_count = None
+        self.lines = []
+        self.line_completions = []
+
+
+class ViewIndex(object):
+    """An inverted index of the completions found in a set of views.
+
+    self.postings maps each completion to a dict of the number of times it
+    was found in each view, keyed by view id. Views are added and updated by
+    update_view, which only re-extracts the lines that changed since the
+    view was last indexed, and are dropped by remove_view. The index does not
+    lock itself; callers must not update and read it from different threads
+    at the same time.
+
+    """
+
+    def __init__(self, extract_completions):
+        """Create an empty index.
+
+        Keyword arguments:
+        extract_completions - A function that returns a tuple of the
+                              completions found in a line
+
+        """
+        super(ViewIndex, self).__init__()
+        self.extract_completions = extract_completions
+        self.postings = dict()
+        self.views = dict()
+
+    def __len__(self):
+        return len(self.postings)
+
+    def __contains__(self, view_id):
+        return view_id in self.views
+
+    @property
+    def completions(self):
+        """A live view of the completions found in any indexed view."""
+        return self.postings.keys()
+
+    def views_for(self, completion):
+        """Return a dict of the count of completion in each view, by view id."""
+        return dict(self.postings.get(completion, ()))
+
+    def change_count(self, view_id):
+        """Return the change count of a view when it was indexed, or None."""
+        try:
+            return self.views[view_id].change_count
+        except KeyError:
+            return None
+
+    def update_view(self, view_id, change_count, lines):
+        """Index the lines of a view, re-extracting only the modified lines.
+
+        Returns a tuple of (added, removed) lists of the completions that
+        were added to or removed from the whole index.
+
+        """
+        try:
+            entry = self.views[view_id]
+        except KeyError:
+            entry = self.views[view_id] = IndexedView()
+        start, old_end, new_end = modified_lines(entry.lines, lines)
+        new_completions = [self.extract_completions(l)
+                           for l in lines[start:new_end]]
+
+        removed = []
+        for c in entry.line_completions[start:old_end]:
+            self._remove(view_id, c, removed)
+        added = []
+        for c in new_completions:
+            self._add(view_id, c, added)
+
+        entry.line_completions[start:old_end] = new_completions
+        entry.lines = lines
+        entry.change_count = change_count
+        return (added, removed)
+
+    def remove_view(self, view_id):
+        """Drop a view from the index.
+
+        Returns a list of the completions that are no longer in any view.
+
+        """
+        removed = []
+        entry = self.views.pop(view_id, None)
+        if entry is not None:
+            for c in entry.line_completions:
+                self._remove(view_id, c, removed)
+        return removed
+
+    def clear(self):
+        """Drop every view from the index."""
+        self.postings = dict()
+        self.views = dict()
+
+    def _add(self, view_id, completions, added):
+        """Add a posting for each completion, appending new ones to added."""
+        postings = self.postings
+        for c in completions:
+            views = postings.get(c)
+            if views is None:
+                postings[c] = {view_id: 1}
+                added.append(c)
+            else:
+                views[view_id] = views.get(view_id, 0) + 1
+
+    def _remove(self, view_id, completions, removed):
+        """Remove a posting for each completion, appending dropped ones to removed."""
+        postings = self.postings
+        for c in completions:
+            views = postings[c]
+            n = views[view_id] - 1
+            if n > 0:
+                views[view_id] = n
+            else:
+                del views[view_id]
+                if not views:
+                    del postings[c]
+                    removed.append(c)